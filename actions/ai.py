@@ -6,33 +6,85 @@
 import tcod
 
 import actions.common
+import instrument
+import items.other
+import items.potions
 from actions import Action, Impossible
 from states import ingame
 
 if TYPE_CHECKING:
     from actor import Actor
+    from gamemap import GameMap
+    from model import Model
 
 
 class PathTo(Action):
+    """Follow a path to a destination, re-planning only when it's invalidated.
+
+    The class attributes `cache_hits` and `cache_misses` count how often a
+    previous path was reused or had to be recomputed.
+    """
+
+    LOOKAHEAD = 3  # Number of upcoming steps checked for new blockers.
+    TOLERANCE = 1  # How far the destination can move before re-planning.
+
+    cache_hits = 0
+    cache_misses = 0
+
     def __init__(self, actor: Actor, dest_xy: Tuple[int, int]) -> None:
         super().__init__(actor)
         self.subaction: Optional[Action] = None
         self.dest_xy = dest_xy
         self.path_xy: List[Tuple[int, int]] = self.compute_path()
+        self.tiles_revision = self.map.tiles_revision
+        PathTo.cache_misses += 1
 
+    @instrument.timed("compute_path")
     def compute_path(self) -> List[Tuple[int, int]]:
         map_ = self.actor.location.map
-        walkable = np.copy(map_.tiles["move_cost"])
-        blocker_pos = [e.location.ij for e in map_.actors]
-        blocker_index = tuple(np.transpose(blocker_pos))
-        walkable[blocker_index] = 50
+        walkable = np.array(map_.move_cost)
+        walkable[np.asarray(map_.actor_mask)] = 50
         walkable.T[self.dest_xy] = 1
         graph = tcod.path.SimpleGraph(cost=walkable, cardinal=2, diagonal=3)
         pf = tcod.path.Pathfinder(graph)
         pf.add_root(self.actor.location.ij)
         return [(ij[1], ij[0]) for ij in pf.path_to(self.dest_xy[::-1])[1:].tolist()]
 
+    def set_destination(self, dest_xy: Tuple[int, int]) -> None:
+        """Change the destination, the path is re-planned on demand."""
+        self.dest_xy = dest_xy
+
+    def is_path_valid(self) -> bool:
+        """Return True if the current path can still be followed."""
+        if not self.path_xy:
+            return False
+        if self.tiles_revision != self.map.tiles_revision:
+            return False
+        if self.location.distance_to(*self.path_xy[0]) > 1:
+            return False  # Actor is no longer at the start of this path.
+        end_x, end_y = self.path_xy[-1]
+        drift = max(abs(end_x - self.dest_xy[0]), abs(end_y - self.dest_xy[1]))
+        if drift > self.TOLERANCE:
+            return False  # Destination has moved too far away.
+        for xy in self.path_xy[: self.LOOKAHEAD]:
+            if xy != self.dest_xy and self.map.is_blocked(*xy):
+                return False
+        return True
+
+    def update_path(self) -> None:
+        """Recompute the path if it's no longer valid."""
+        if self.is_path_valid():
+            PathTo.cache_hits += 1
+            return
+        if self.location.xy == self.dest_xy:
+            self.path_xy = []
+            return
+        PathTo.cache_misses += 1
+        self.path_xy = self.compute_path()
+        self.tiles_revision = self.map.tiles_revision
+
     def plan(self) -> Action:
+        self.update_path()
         if not self.path_xy:
             raise Impossible("End of path reached.")
         self.subaction = actions.common.MoveTo(self.actor, self.path_xy[0]).plan()
@@ -45,6 +97,73 @@ def act(self) -> None:
             self.path_xy.pop(0)
 
 
+class ChasePlayer(Action):
+    """Take one step towards the player using the maps shared flow field."""
+
+    DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (1, -1), (-1, 1), (1, 1))
+
+    @classmethod
+    def get_steps(cls, map_: GameMap, xy: np.ndarray) -> List[List[Tuple[int, int]]]:
+        """Return the steps towards the player for an (n, 2) array of positions.
+
+        Each list holds the directions which lead closer to the player, from
+        the best to the worst, in the order `plan` would pick them.  Walls are
+        left out, but other actors are not since they may move before these
+        steps are taken.
+        """
+        distance, origin = map_.get_player_distance()
+        height, width = distance.shape
+        xy = xy - origin  # Positions within the flow field.
+        directions = np.array(cls.DIRECTIONS)
+        x = xy[:, :1] + directions[:, 0]
+        y = xy[:, 1:] + directions[:, 1]
+        inside = (0 <= x) & (x < width) & (0 <= y) & (y < height)
+        x = x.clip(0, width - 1)
+        y = y.clip(0, height - 1)
+        step_distance = distance[y, x]
+        current = distance[xy[:, 1].clip(0, height - 1), xy[:, 0].clip(0, width - 1)]
+        valid = (
+            inside
+            & (map_.move_cost[y + origin[1], x + origin[0]] != 0)
+            & (step_distance < current[:, np.newaxis])
+        )
+        step_distance[~valid] = np.iinfo(step_distance.dtype).max
+        order = np.argsort(step_distance, axis=1, kind="stable")
+        return [
+            [cls.DIRECTIONS[i] for i in row[:count]]
+            for row, count in zip(order.tolist(), valid.sum(axis=1).tolist())
+        ]
+
+    def plan(self) -> Action:
+        map_ = self.map
+        distance, (x0, y0) = map_.get_player_distance()
+        height, width = distance.shape
+        x, y = self.location.xy
+        if not (0 <= x - x0 < width and 0 <= y - y0 < height):
+            raise Impossible("The player is too far away to chase.")
+        best_direction: Optional[Tuple[int, int]] = None
+        best_distance = distance[y - y0, x - x0]
+        for dx, dy in self.DIRECTIONS:
+            i, j = y + dy - y0, x + dx - x0
+            if not (0 <= i < height and 0 <= j < width):
+                continue
+            if map_.is_blocked(x + dx, y + dy):
+                continue
+            if distance[i, j] < best_distance:
+                best_direction = dx, dy
+                best_distance = distance[i, j]
+        if best_direction is None:
+            raise Impossible("No free step towards the player.")
+        return actions.common.Move(self.actor, best_direction).plan()
+
+
+class BecomeDormant(Action):
+    """Stop taking turns until the player comes near, see GameMap.wake_dormant."""
+
+    def act(self) -> None:
+        self.map.add_dormant(self.actor)
+
+
 class AI(Action):
     pass
 
@@ -53,16 +172,33 @@ class BasicMonster(AI):
     def __init__(self, actor: Actor) -> None:
         super().__init__(actor)
         self.pathfinder: Optional[PathTo] = None
+        self.last_seen_xy: Optional[Tuple[int, int]] = None
 
     def plan(self) -> Action:
         owner = self.actor
         map_ = owner.location.map
         if map_.visible[owner.location.ij]:
-            self.pathfinder = PathTo(owner, map_.player.location.xy)
+            # While in view, chase the player using the shared flow field.
+            self.last_seen_xy = map_.player.location.xy
+            if owner.location.distance_to(*self.last_seen_xy) <= 1:
+                return actions.common.AttackPlayer(owner).plan()
+            try:
+                return ChasePlayer(owner).plan()
+            except Impossible:
+                return actions.common.Move(owner, (0, 0)).plan()
+        if self.last_seen_xy:
+            # Out of view, path to where the player was last seen.
+            if self.pathfinder:
+                self.pathfinder.set_destination(self.last_seen_xy)
+            else:
+                self.pathfinder = PathTo(owner, self.last_seen_xy)
+            self.last_seen_xy = None
         if not self.pathfinder:
+            if owner.location.distance_to(*map_.player.location.xy) > (
+                map_.DORMANT_DISTANCE
+            ):
+                return BecomeDormant(owner)
             return actions.common.Move(owner, (0, 0)).plan()
-        if owner.location.distance_to(*map_.player.location.xy) <= 1:
-            return actions.common.AttackPlayer(owner).plan()
         try:
             return self.pathfinder.plan()
         except Impossible:
@@ -71,13 +207,168 @@ def plan(self) -> Action:
 
 
 class PlayerControl(AI):
+    resting_since: Optional[int] = None  # The report_count when resting began.
+
     def act(self) -> None:
+        if self.resting_since is not None:
+            rest = actions.common.Rest(self.actor)
+            if rest.is_disturbed() or self.model.report_count != self.resting_since:
+                self.resting_since = None
+            else:
+                # Keep resting without waiting for input or drawing the screen.
+                return rest.act()
         ticket = self.actor.ticket
         while ticket is self.actor.ticket:
             next_action = ingame.PlayerReady(self.actor.location.map.model).loop()
             if next_action is None:
                 continue
             try:
-                next_action.plan().act()
+                next_action = next_action.plan()
+                next_action.act()
             except Impossible as exc:
                 self.report(exc.args[0])
+                continue
+            if isinstance(next_action, actions.common.Rest):
+                self.resting_since = self.model.report_count
+
+
+class AutoPlayer(AI):
+    """A computer controlled player, used when running without a window."""
+
+    def __init__(self, actor: Actor) -> None:
+        super().__init__(actor)
+        self.pathfinder: Optional[PathTo] = None
+
+    def plan(self) -> Action:
+        owner = self.actor
+        map_ = owner.location.map
+        if owner.hp <= owner.max_hp // 2:
+            for item in owner.inventory.contents:
+                if isinstance(item, (items.other.Eatable, items.potions.Potion)):
+                    return actions.common.ActivateItem(owner, item).plan()
+        # Only actors within FOV_RADIUS can be visible, so check those alone.
+        targets = [
+            actor
+            for actor in map_.actor_store.within(*owner.location.xy, map_.FOV_RADIUS)
+            if actor is not owner and map_.visible[actor.location.ij]
+        ]
+        if targets:
+            # Ties are broken by position, so that the order of rows doesn't matter.
+            target = min(
+                targets,
+                key=lambda a: (
+                    owner.location.distance_to(*a.location.xy),
+                    a.location.xy,
+                ),
+            )
+            try:
+                return actions.common.MoveTowards(owner, target.location.xy).plan()
+            except Impossible:
+                pass
+        if map_.items.get(owner.location.xy):
+            return actions.common.Pickup(owner).plan()
+        return self.explore()
+
+    def explore(self) -> Action:
+        """Walk towards a random unexplored tile, then take the stairs down."""
+        owner = self.actor
+        map_ = owner.location.map
+        if self.pathfinder:
+            try:
+                return self.pathfinder.plan()
+            except Impossible:
+                self.pathfinder = None
+        walkable = np.asarray(map_.move_cost) != 0
+        candidates = np.argwhere(~np.asarray(map_.explored) & walkable)
+        stairs_down = [xy for xy, change in map_.stairs.items() if change > 0]
+        if not len(candidates) and stairs_down:
+            if owner.location.xy == stairs_down[0]:
+                return actions.common.TakeStairs(owner).plan()
+            self.pathfinder = PathTo(owner, stairs_down[0])
+            return actions.common.Move(owner, (0, 0)).plan()
+        if not len(candidates):
+            candidates = np.argwhere(walkable)
+        i, j = candidates[self.model.rng.randrange(len(candidates))].tolist()
+        self.pathfinder = PathTo(owner, (j, i))
+        return actions.common.Move(owner, (0, 0)).plan()
+
+
+MIN_BATCH = 8  # Smaller groups are faster to take one at a time.
+
+
+@instrument.timed("take_monster_turns")
+def take_monster_turns(model: Model) -> int:
+    """Take the turns of every monster due on the next tick as a group.
+
+    Monsters are taken from the front of the turn queue up to the first
+    ticket which isn't a monsters.  Visibility and the steps of monsters
+    chasing the player are looked up for the whole group before any of them
+    move.  Then in turn order, chasers take their first free step and idle
+    monsters near the player wait, any other turn is taken through
+    `invoke_next`.  This gives the same results as calling `invoke_next` for
+    each monster, and stops early if the player dies.
+
+    Each turn is timed under "turn" like `Actor.act`, the lookups shared by
+    the group are only timed as part of this function.
+
+    Returns the number of turns taken, this is 0 if the next turn isn't a
+    monsters.
+    """
+    scheduler = model.scheduler
+    map_ = model.active_map
+    player_xy = map_.player.location.xy
+    batch: List[Actor] = []
+    for due in scheduler.due():
+        actor = getattr(due.func, "__self__", None)  # The owner of `act`.
+        if actor is None or actor is map_.player or actor.ticket is not due:
+            break
+        batch.append(actor)
+    # Steps for each monster, or None for turns which are taken normally.
+    plans: List[Optional[List[Tuple[int, int]]]] = [None] * len(batch)
+    chasing = np.zeros(len(batch), dtype=bool)
+    if len(batch) >= MIN_BATCH:
+        xy = np.array([actor.location.xy for actor in batch])
+        # Single tile reads are faster than index arrays for chunked arrays.
+        in_view = np.array(
+            [
+                type(actor.ai) is BasicMonster and map_.visible[actor.location.ij]
+                for actor in batch
+            ],
+            dtype=bool,
+        )
+        player_distance = np.abs(xy - player_xy).max(axis=1)
+        chasing = in_view & (player_distance > 1)
+        if chasing.any():
+            chase_steps = ChasePlayer.get_steps(map_, xy[chasing])
+            for i, steps in zip(np.flatnonzero(chasing).tolist(), chase_steps):
+                plans[i] = steps
+        nearby = (player_distance <= map_.DORMANT_DISTANCE).tolist()
+        for i, actor in enumerate(batch):
+            ai = actor.ai
+            if type(ai) is BasicMonster and not in_view[i] and nearby[i]:
+                if ai.last_seen_xy is None and ai.pathfinder is None:
+                    plans[i] = []  # Idle, this monster will wait.
+
+    turns = 0
+    for actor, actor_steps, chaser in zip(batch, plans, chasing.tolist()):
+        if model.is_player_dead:
+            break
+        ticket = actor.ticket
+        if ticket is None:
+            continue  # Killed by an earlier monster in this group.
+        assert scheduler.peek() is ticket
+        turns += 1
+        if actor_steps is None or ticket.tick != scheduler.current_tick:
+            scheduler.invoke_next()
+            continue
+        with instrument.timer("turn", type(actor.fighter).__name__):
+            if chaser:
+                assert isinstance(actor.ai, BasicMonster)
+                actor.ai.last_seen_xy = player_xy
+                x, y = actor.location.xy
+                for dx, dy in actor_steps:
+                    if (x + dx, y + dy) not in map_.actor_index:
+                        actor.location = map_[x + dx, y + dy]
+                        break
+            actor.reschedule(100)
+    return turns
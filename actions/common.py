@@ -64,7 +64,7 @@ def act(self) -> None:
         target = self.map.fighter_at(*self.target_pos)
         assert target
 
-        damage = self.actor.fighter.power - target.fighter.defense
+        damage = self.actor.power - target.defense
 
         if self.actor.is_player():
             who_desc = f"You attack the {target.fighter.name}"
@@ -86,6 +86,56 @@ def plan(self) -> Action:
         return MoveTowards(self.actor, self.map.player.location.xy).plan()
 
 
+class TakeStairs(Action):
+    """Use the stairs this actor is standing on."""
+
+    def plan(self) -> Action:
+        if self.location.xy not in self.map.stairs:
+            raise Impossible("There are no stairs here.")
+        if not self.actor.is_player():
+            raise Impossible("Only the player can change floors.")
+        return self
+
+    def act(self) -> None:
+        change = self.map.stairs[self.location.xy]
+        self.actor.reschedule(100)
+        self.model.floors.change_floor(self.map.depth + change)
+        if change > 0:
+            self.report("You descend the stairs.")
+        else:
+            self.report("You ascend the stairs.")
+
+
+class Rest(Action):
+    """Wait for one turn to recover health.
+
+    The player keeps resting on their following turns until `is_disturbed`.
+    """
+
+    REGEN_TURNS = 10  # Turns of rest needed to recover 1 HP.
+
+    def enemies_in_view(self) -> bool:
+        """Return True if any other actor is visible."""
+        in_view = self.map.actor_store.in_mask(self.map.visible)
+        return any(actor is not self.actor for actor in in_view)
+
+    def is_disturbed(self) -> bool:
+        """Return True if resting should stop."""
+        return self.actor.hp >= self.actor.max_hp or self.enemies_in_view()
+
+    def plan(self) -> Action:
+        if self.actor.hp >= self.actor.max_hp:
+            raise Impossible("You are already at full health.")
+        if self.enemies_in_view():
+            raise Impossible("You can't rest with enemies in view.")
+        return self
+
+    def act(self) -> None:
+        if self.model.scheduler.current_tick // 100 % self.REGEN_TURNS == 0:
+            self.actor.hp += 1
+        self.actor.reschedule(100)
+
+
 class Pickup(Action):
     def plan(self) -> Action:
         if not self.map.items.get(self.location.xy):
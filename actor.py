@@ -4,46 +4,82 @@
 import traceback
 from typing import TYPE_CHECKING, Optional, Type
 
+import instrument
 import items.other
 from actions import Impossible
+from actorstore import Column
 
 if TYPE_CHECKING:
     from actions import Action
     from inventory import Inventory
     from location import Location
     from races import Fighter
-    from tqueue import Ticket, TurnQueue
+    from tqueue import Scheduler, Ticket
 
 
 class Actor:
+    """A view over one row of its maps ActorStore, plus its AI and fighter."""
+
+    hp: Column[int] = Column()
+    max_hp: Column[int] = Column()
+    power: Column[int] = Column()
+    defense: Column[int] = Column()
+    alive: Column[bool] = Column()
+
     def __init__(self, location: Location, fighter: Fighter, ai_cls: Type[Action]):
-        self.location = location
+        self._location = location
         self.fighter = fighter
-        location.map.actors.add(self)
+        self.store = location.map.actor_store
+        self.row = self.store.add(self)
+        location.map.add_actor(self)
         self.ticket: Optional[Ticket] = self.scheduler.schedule(0, self.act)
         self.ai = ai_cls(self)
 
-    def act(self, scheduler: TurnQueue, ticket: Ticket) -> None:
+    def act(self, scheduler: Scheduler, ticket: Ticket) -> None:
         if ticket is not self.ticket:
             return scheduler.unschedule(ticket)
-        try:
-            action = self.ai.plan()
-        except Impossible:
-            print(f"Unresolved action with {self}!", file=sys.stderr)
-            traceback.print_exc(file=sys.stderr)
-            return self.reschedule(100)
-        assert action is action.plan(), f"{action} was not fully resolved, {self}."
-        action.act()
+        with instrument.timer("turn", type(self.fighter).__name__):
+            try:
+                with instrument.timer("plan", type(self.fighter).__name__):
+                    action = self.ai.plan()
+            except Impossible:
+                print(f"Unresolved action with {self}!", file=sys.stderr)
+                traceback.print_exc(file=sys.stderr)
+                return self.reschedule(100)
+            assert action is action.plan(), f"{action} was not fully resolved, {self}."
+            with instrument.timer("act", type(action).__name__):
+                action.act()
+
+    @property
+    def location(self) -> Location:
+        return self._location
+
+    @location.setter
+    def location(self, location: Location) -> None:
+        """Move this actor, keeping the maps position index up to date."""
+        old_map = self._location.map
+        if self not in old_map.actors:
+            self._location = location  # Dead actors are not indexed.
+            return
+        if old_map is location.map:
+            old_xy = self._location.xy
+            self._location = location
+            if old_xy != location.xy:
+                old_map.move_actor(self, old_xy)
+            return
+        old_map.remove_actor(self)
+        self._location = location
+        location.map.add_actor(self)
 
     @property
-    def scheduler(self) -> TurnQueue:
+    def scheduler(self) -> Scheduler:
         return self.location.map.model.scheduler
 
     def reschedule(self, interval: int) -> None:
         """Reschedule this actor to run after `interval` ticks."""
         if self.ticket is None:
             # Actor has died during their own turn.
-            assert not self.fighter.alive
+            assert not self.alive
             return
         self.ticket = self.scheduler.reschedule(self.ticket, interval)
 
@@ -64,8 +100,8 @@ def __repr__(self) -> str:
 
     def die(self) -> None:
         """Perform on death logic."""
-        assert self.fighter.alive
-        self.fighter.alive = False
+        assert self.alive
+        self.alive = False
         if self.is_visible():
             if self.is_player():
                 self.location.map.model.report("You die.")
@@ -76,15 +112,14 @@ def die(self) -> None:
         for item in list(self.fighter.inventory.contents):
             item.lift()
             item.place(self.location)
-        self.location.map.actors.remove(self)  # Actually remove the actor.
-        if self.scheduler.heap[0] is self.ticket:
-            # If this actor killed itself during its turn then it must edit the queue.
-            self.scheduler.unschedule(self.ticket)
+        self.location.map.remove_actor(self)  # Actually remove the actor.
+        if self.ticket is not None:
+            self.scheduler.cancel(self.ticket)
         self.ticket = None  # Disable AI.
 
     def damage(self, damage: int) -> None:
         """Damage a fighter and check for its death."""
         assert damage >= 0
-        self.fighter.hp -= damage
-        if self.fighter.hp <= 0:
+        self.hp -= damage
+        if self.hp <= 0:
             self.die()
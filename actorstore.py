@@ -0,0 +1,188 @@
+"""Columnar storage for actor stats and positions."""
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    overload,
+)
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from actor import Actor
+    from chunks import ChunkedArray
+    from races import Fighter
+
+T = TypeVar("T")
+
+# Data type for a single row of actor data.
+actor_dt = np.dtype(
+    [
+        ("x", np.int32),
+        ("y", np.int32),
+        ("hp", np.int32),
+        ("max_hp", np.int32),
+        ("power", np.int32),
+        ("defense", np.int32),
+        ("alive", bool),
+        ("type_id", np.int32),
+    ]
+)
+
+
+class Column(Generic[T]):
+    """Descriptor which exposes a column of an actors row as an attribute."""
+
+    def __set_name__(self, owner: Any, name: str) -> None:
+        self.name = name
+
+    @overload
+    def __get__(self, obj: None, objtype: Any = None) -> Column[T]:
+        ...
+
+    @overload
+    def __get__(self, obj: Actor, objtype: Any = None) -> T:
+        ...
+
+    def __get__(self, obj: Optional[Actor], objtype: Any = None) -> Any:
+        if obj is None:
+            return self
+        return obj.store.data[self.name][obj.row].item()
+
+    def __set__(self, obj: Actor, value: T) -> None:
+        obj.store.data[self.name][obj.row] = value
+
+
+class ActorStore:
+    """Holds the stats and positions of a maps actors as NumPy columns.
+
+    Each actor owns one row, rows of dead actors are kept so that their final
+    stats can still be read, but are skipped by every query.  `compact` drops
+    them along with the rows of actors which have left.
+    """
+
+    def __init__(self, capacity: int = 16) -> None:
+        self.data = np.zeros(capacity, dtype=actor_dt)
+        self.actors: List[Optional[Actor]] = []  # The actor for each row.
+        self.types: List[Type[Fighter]] = []  # Fighter classes by type_id.
+        self.type_ids: Dict[Type[Fighter], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.actors)
+
+    @property
+    def columns(self) -> np.ndarray:
+        """The rows currently in use."""
+        return self.data[: len(self)]
+
+    def get_type_id(self, fighter_cls: Type[Fighter]) -> int:
+        """Return the type_id for a Fighter class, registering it if needed."""
+        if fighter_cls not in self.type_ids:
+            self.type_ids[fighter_cls] = len(self.types)
+            self.types.append(fighter_cls)
+        return self.type_ids[fighter_cls]
+
+    def add(self, actor: Actor, stats: Optional[np.void] = None) -> int:
+        """Add a row for `actor` and return its index.
+
+        `stats` is an existing row to copy, otherwise the row starts with the
+        base stats of the actors fighter.
+        """
+        row = len(self)
+        if row == len(self.data):
+            self.data = np.resize(self.data, len(self.data) * 2)
+        if stats is not None:
+            self.data[row] = stats
+        else:
+            fighter = actor.fighter
+            self.data[row] = (
+                0,
+                0,
+                fighter.hp,
+                fighter.hp,
+                fighter.power,
+                fighter.defense,
+                True,
+                0,
+            )
+        self.data["x"][row], self.data["y"][row] = actor.location.xy
+        self.data["type_id"][row] = self.get_type_id(type(actor.fighter))
+        self.actors.append(actor)
+        return row
+
+    def compact(self) -> None:
+        """Drop the rows of dead and released actors, renumbering the others.
+
+        Call this before pickling, rows are otherwise never reused.  Dead
+        actors are moved to a store of their own, so that any remaining
+        references to them can still read their final stats.
+        """
+        for row in np.flatnonzero(~self.columns["alive"]).tolist():
+            actor = self.actors[row]
+            if actor is not None:
+                actor.store = ActorStore(capacity=1)
+                actor.row = actor.store.add(actor, self.data[row])
+        rows = self.living()
+        actors = self.get_actors(rows)
+        data = np.zeros(max(16, len(rows)), dtype=actor_dt)
+        data[: len(rows)] = self.data[rows]
+        self.data = data
+        self.actors = list(actors)
+        for row, actor in enumerate(actors):
+            actor.row = row
+
+    def release(self, row: int) -> None:
+        """Stop tracking a row, used when a living actor leaves this store."""
+        self.data["alive"][row] = False
+        self.actors[row] = None
+
+    def get_actors(self, rows: np.ndarray) -> List[Actor]:
+        """Return the actors for an array of row indexes."""
+        actors: List[Actor] = []
+        for row in rows.tolist():
+            actor = self.actors[row]
+            assert actor is not None
+            actors.append(actor)
+        return actors
+
+    def living(self) -> np.ndarray:
+        """Return the row indexes of all living actors."""
+        return np.flatnonzero(self.columns["alive"])
+
+    def within(self, x: int, y: int, radius: int) -> List[Actor]:
+        """Return the living actors within `radius` steps of x,y."""
+        columns = self.columns
+        distance = np.maximum(np.abs(columns["x"] - x), np.abs(columns["y"] - y))
+        return self.get_actors(np.flatnonzero(columns["alive"] & (distance <= radius)))
+
+    def in_mask(self, mask: Union[np.ndarray, ChunkedArray]) -> List[Actor]:
+        """Return the living actors standing on True tiles of a 2D mask."""
+        rows = self.living()
+        rows = rows[mask[self.data["y"][rows], self.data["x"][rows]]]
+        return self.get_actors(rows)
+
+    def of_type(self, fighter_cls: Type[Fighter]) -> List[Actor]:
+        """Return the living actors whose fighter is an instance of `fighter_cls`."""
+        type_ids = [
+            i for i, cls in enumerate(self.types) if issubclass(cls, fighter_cls)
+        ]
+        columns = self.columns
+        return self.get_actors(
+            np.flatnonzero(columns["alive"] & np.isin(columns["type_id"], type_ids))
+        )
+
+    def type_graphics(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the (ch, fg, render_order) arrays indexed by type_id."""
+        ch = np.array([cls.char for cls in self.types], dtype=np.int32)
+        fg = np.array([cls.color for cls in self.types], dtype=np.uint8).reshape(-1, 3)
+        order = np.array([cls.render_order for cls in self.types], dtype=np.int32)
+        return ch, fg, order
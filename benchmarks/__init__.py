@@ -0,0 +1,94 @@
+"""Repeatable benchmarks for the games hot paths.
+
+Run with ``python -m benchmarks``.  Results are printed as JSON so that runs
+from different commits can be compared.
+"""
+from __future__ import annotations
+
+import platform
+import random
+import statistics
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import tcod
+
+# A case does its setup and returns the function to be timed.
+Case = Callable[[], Callable[[], None]]
+
+
+class Benchmark(NamedTuple):
+    name: str
+    case: Case
+    repeat: int
+
+
+REGISTRY: List[Benchmark] = []
+
+
+def benchmark(name: str, repeat: int = 5) -> Callable[[Case], Case]:
+    """Register a benchmark case under `name`."""
+
+    def decorator(case: Case) -> Case:
+        REGISTRY.append(Benchmark(name, case, repeat))
+        return case
+
+    return decorator
+
+
+def run_benchmark(bench: Benchmark, seed: int, repeat: Optional[int]) -> Dict[str, Any]:
+    """Run a single benchmark and return its timing statistics in seconds.
+
+    The random module is reseeded before each setup so that every run is the
+    same.
+    """
+    timings: List[float] = []
+    for _ in range(repeat or bench.repeat):
+        random.seed(seed)
+        func = bench.case()
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+    return {
+        "repeat": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings),
+    }
+
+
+def get_commit() -> Optional[str]:
+    """Return the current git commit, if there is one."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(
+    name_filter: str = "", seed: int = 0, repeat: Optional[int] = None
+) -> Dict[str, Any]:
+    """Run all registered benchmarks with `name_filter` in their name."""
+    import benchmarks.cases  # noqa: F401  # Registers the benchmark cases.
+
+    results = {
+        bench.name: run_benchmark(bench, seed, repeat)
+        for bench in REGISTRY
+        if name_filter in bench.name
+    }
+    return {
+        "commit": get_commit(),
+        "seed": seed,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "tcod": tcod.__version__,
+        "results": results,
+    }
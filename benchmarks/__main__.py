@@ -0,0 +1,27 @@
+import argparse
+import contextlib
+import io
+import json
+
+import benchmarks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("-k", "--filter", default="", help="Only run matching names.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=None, help="Override repeats.")
+    parser.add_argument("-o", "--output", help="Write JSON to this file.")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Silence game messages.
+        report = benchmarks.run_all(args.filter, args.seed, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
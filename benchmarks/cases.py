@@ -0,0 +1,220 @@
+"""Benchmark cases, registered on import."""
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+from typing import Callable, Iterator, List, Tuple, Type
+
+import numpy as np
+import tcod
+
+import gamemap
+import procgen.dungeon
+import races.common
+import rendering
+import states.mainmenu
+import tqueue
+from actions import ai
+from actions.ai import PathTo
+from benchmarks import benchmark
+from model import Model
+
+
+def new_map(width: int = 80, height: int = 45) -> gamemap.GameMap:
+    """Return a newly generated map attached to a new Model."""
+    model = Model()
+    model.active_map = procgen.dungeon.generate(model, width, height)
+    return model.active_map
+
+
+@contextlib.contextmanager
+def working_directory(path: str) -> Iterator[None]:
+    """Temporarily change the current working directory."""
+    old_dir = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old_dir)
+
+
+def free_spaces(gm: gamemap.GameMap, number: int) -> List[Tuple[int, int]]:
+    """Return up to `number` random unoccupied floor positions."""
+    free = np.argwhere((np.asarray(gm.move_cost) != 0) & ~np.asarray(gm.actor_mask))
+    picked = random.sample(free.tolist(), min(number, len(free)))
+    return [(x, y) for y, x in picked]
+
+
+def register_generate(width: int, height: int, repeat: int = 5) -> None:
+    @benchmark(f"procgen.generate.{width}x{height}", repeat)
+    def generate() -> Callable[[], None]:
+        def func() -> None:
+            model = Model()
+            model.active_map = procgen.dungeon.generate(model, width, height)
+
+        return func
+
+
+for _width, _height in [(80, 45), (160, 90), (320, 180), (512, 512)]:
+    register_generate(_width, _height)
+register_generate(2048, 2048, repeat=3)
+
+
+def register_update_fov(name: str, width: int, height: int) -> None:
+    @benchmark(name)
+    def update_fov() -> Callable[[], None]:
+        gm = new_map(width, height)
+        positions = free_spaces(gm, 200)
+
+        def func() -> None:
+            for xy in positions:
+                gm.player.location = gm[xy]
+                gm.update_fov()
+
+        return func
+
+
+register_update_fov("gamemap.update_fov", 160, 90)
+register_update_fov("gamemap.update_fov.2048x2048", 2048, 2048)
+
+
+def register_player_distance(name: str, width: int, height: int) -> None:
+    @benchmark(name)
+    def player_distance() -> Callable[[], None]:
+        gm = new_map(width, height)
+        positions = free_spaces(gm, 20)
+
+        def func() -> None:
+            for xy in positions:
+                gm.player.location = gm[xy]
+                gm.get_player_distance()
+
+        return func
+
+
+register_player_distance("gamemap.get_player_distance", 160, 90)
+register_player_distance("gamemap.get_player_distance.2048x2048", 2048, 2048)
+
+
+@benchmark("ai.PathTo.compute_path")
+def compute_path() -> Callable[[], None]:
+    gm = new_map(160, 90)
+    for xy in free_spaces(gm, 1000):
+        races.common.Orc.spawn(gm[xy])
+    monsters = [actor for actor in gm.actors if actor is not gm.player][:100]
+    paths = [PathTo(actor, gm.player.location.xy) for actor in monsters]
+
+    def func() -> None:
+        for path in paths:
+            path.compute_path()
+
+    return func
+
+
+def register_turn_queue(
+    name: str, scheduler: Type[tqueue.Scheduler], size: int
+) -> None:
+    @benchmark(name)
+    def turn_queue() -> Callable[[], None]:
+        queue = scheduler()
+
+        def reschedule(scheduler: tqueue.Scheduler, ticket: tqueue.Ticket) -> None:
+            scheduler.reschedule(ticket, 100)
+
+        for _ in range(size):
+            queue.schedule(random.randint(0, 100), reschedule)
+
+        def func() -> None:
+            for _ in range(100_000):
+                queue.invoke_next()
+
+        return func
+
+
+register_turn_queue("tqueue.TurnQueue", tqueue.TurnQueue, 10_000)
+register_turn_queue("tqueue.TimingWheel", tqueue.TimingWheel, 10_000)
+register_turn_queue("tqueue.TurnQueue.100000", tqueue.TurnQueue, 100_000)
+register_turn_queue("tqueue.TimingWheel.100000", tqueue.TimingWheel, 100_000)
+
+
+class Wait(ai.AI):
+    """Skips every turn, without updating the players field of view."""
+
+    def act(self) -> None:
+        self.actor.reschedule(100)
+
+
+def register_monster_turns(name: str, batch: bool) -> None:
+    @benchmark(name, repeat=3)
+    def monster_turns() -> Callable[[], None]:
+        gm = new_map(160, 90)
+        for xy in free_spaces(gm, 1000):
+            races.common.Orc.spawn(gm[xy])
+        gm.player.ai = Wait(gm.player)
+        gm.player.hp = gm.player.max_hp = 1_000_000
+        gm.visible[...] = True  # Every monster chases the player.
+        model = gm.model
+
+        def func() -> None:
+            end_tick = model.scheduler.current_tick + 1000
+            with contextlib.redirect_stdout(io.StringIO()):
+                while model.scheduler.current_tick < end_tick:
+                    if not (batch and ai.take_monster_turns(model)):
+                        model.scheduler.invoke_next()
+
+        return func
+
+
+register_monster_turns("ai.monster_turns", batch=False)
+register_monster_turns("ai.take_monster_turns", batch=True)
+
+
+@benchmark("gamemap.render")
+def render() -> Callable[[], None]:
+    gm = new_map(160, 90)
+    gm.explored[...] = True
+    gm.camera_xy = gm.player.location.xy
+    console = tcod.Console(80, 50)
+
+    def func() -> None:
+        for _ in range(100):
+            gm.render(console)
+
+    return func
+
+
+@benchmark("rendering.draw_main_view")
+def draw_main_view() -> Callable[[], None]:
+    gm = new_map(160, 90)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(10_000):
+            gm.model.report(f"Message number {i // 3}, which wraps onto two lines.")
+    console = tcod.Console(80, 50)
+
+    def func() -> None:
+        for _ in range(100):
+            rendering.draw_main_view(gm.model, console)
+
+    return func
+
+
+@benchmark("mainmenu.save_load", repeat=3)
+def save_load() -> Callable[[], None]:
+    gm = new_map(160, 90)
+    tmp_dir = tempfile.TemporaryDirectory()
+    with working_directory(tmp_dir.name):
+        menu = states.mainmenu.MainMenu()
+    menu.model = gm.model
+
+    def func() -> None:
+        with working_directory(tmp_dir.name):
+            menu.save()
+            menu.wait_for_save()
+            loaded = states.mainmenu.MainMenu()
+            loaded.load()
+            assert loaded.model
+
+    return func
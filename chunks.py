@@ -0,0 +1,254 @@
+"""Sparse 2D arrays stored as fixed-size chunks which are allocated on demand."""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+CHUNK_SIZE = 64  # Width and height of each chunk.
+
+Index = Union[int, slice, np.ndarray]
+
+
+def _chunk_slices(
+    start: int, stop: int, size: int
+) -> Iterator[Tuple[int, slice, slice]]:
+    """Yield (chunk, chunk_slice, out_slice) for each chunk overlapping a range."""
+    for chunk in range(start // size, -(-stop // size)):
+        offset = chunk * size
+        low = max(start, offset)
+        high = min(stop, offset + size)
+        chunk_slice = slice(low - offset, high - offset)
+        yield chunk, chunk_slice, slice(low - start, high - start)
+
+
+class ChunkedArray:
+    """A 2D array split into chunks, only chunks which are written to are kept.
+
+    Unallocated chunks read as `fill`.  Indexing supports the NumPy indexes used
+    with map arrays: a single i,j coordinate, rectangular slices, integer index
+    arrays, a boolean mask, or Ellipsis.  Reading always returns a new NumPy
+    array or scalar, so only the chunks overlapping the index are touched.
+
+    `np.asarray` will return the whole array, this should be avoided on large
+    maps.
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, int],
+        dtype: Any,
+        fill: Any = 0,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.fill = self.dtype.type(fill)
+        self.chunk_size = chunk_size
+        self.chunks: Dict[Tuple[int, int], np.ndarray] = {}  # (ci, cj): chunk
+
+    @property
+    def T(self) -> _TransposedView:
+        """A view of this array with the axes swapped, for x,y indexing."""
+        return _TransposedView(self)
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by allocated chunks."""
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def __array__(self, dtype: Any = None, copy: Optional[bool] = None) -> np.ndarray:
+        out: np.ndarray = self[...]
+        return out if dtype is None else out.astype(dtype)
+
+    def _get_chunk(self, key: Tuple[int, int]) -> np.ndarray:
+        """Return the chunk at `key`, allocating it if needed."""
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            size = self.chunk_size
+            chunk = self.chunks[key] = np.full((size, size), self.fill, self.dtype)
+        return chunk
+
+    def _normalize(self, key: Any) -> Tuple[Index, Index]:
+        """Convert `key` into a pair of ints, slices, or index arrays."""
+        if key is Ellipsis:
+            return slice(None), slice(None)
+        if isinstance(key, np.ndarray) and key.dtype == bool:
+            assert key.shape == self.shape
+            rows, cols = np.nonzero(key)
+            return rows, cols
+        if not isinstance(key, tuple):
+            key = key, slice(None)  # Index the first axis only.
+        i, j = key
+        if isinstance(i, (int, slice)) and isinstance(j, (int, slice)):
+            return i, j
+        if np.ndim(i) == 0 and np.ndim(j) == 0:
+            # Scalars such as NumPy integers, possibly mixed with slices.
+            return (
+                i if isinstance(i, slice) else int(i),
+                j if isinstance(j, slice) else int(j),
+            )
+        if isinstance(i, slice) or isinstance(j, slice):
+            raise IndexError("Slices can not be mixed with index arrays.")
+        return np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp)
+
+    def _rect(self, i: Index, j: Index) -> Tuple[int, int, int, int]:
+        """Return the (top, bottom, left, right) bounds of a basic index."""
+        bounds = []
+        for index, length in zip((i, j), self.shape):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(length)
+                if step != 1:
+                    raise IndexError("Slices with a step are not supported.")
+                bounds += [start, max(start, stop)]
+            else:
+                assert isinstance(index, int)
+                if not -length <= index < length:
+                    raise IndexError(f"Index {index} is out of bounds.")
+                index %= length
+                bounds += [index, index + 1]
+        return bounds[0], bounds[1], bounds[2], bounds[3]
+
+    def _wrap_arrays(self, i: Any, j: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Return flat, non-negative copies of a pair of index arrays."""
+        height, width = self.shape
+        i, j = (index.reshape(-1) for index in np.broadcast_arrays(i, j))
+        if np.any((i < -height) | (i >= height) | (j < -width) | (j >= width)):
+            raise IndexError("Index array is out of bounds.")
+        return i % height, j % width
+
+    def _flat_chunks(
+        self, i: np.ndarray, j: np.ndarray
+    ) -> Iterator[Tuple[Tuple[int, int], np.ndarray]]:
+        """Yield (chunk_key, positions) for the chunks of flat index arrays.
+
+        Indexes must already be wrapped by `_wrap_arrays`.
+        """
+        width = self.shape[1]
+        chunk_i = i // self.chunk_size
+        chunk_j = j // self.chunk_size
+        chunk_ids = chunk_i * (width // self.chunk_size + 1) + chunk_j
+        order = np.argsort(chunk_ids, kind="stable")
+        breaks = np.flatnonzero(np.diff(chunk_ids[order])) + 1
+        for positions in np.split(order, breaks):
+            if len(positions):
+                key = int(chunk_i[positions[0]]), int(chunk_j[positions[0]])
+                yield key, positions
+
+    def __getitem__(self, key: Any) -> Any:
+        size = self.chunk_size
+        if type(key) is tuple and len(key) == 2:
+            # Fast path for reading single tiles, which is done very often.
+            i, j = key
+            if type(i) is int and type(j) is int:
+                if 0 <= i < self.shape[0] and 0 <= j < self.shape[1]:
+                    chunk = self.chunks.get((i // size, j // size))
+                    if chunk is None:
+                        return self.fill
+                    return chunk[i % size, j % size]
+        i, j = self._normalize(key)
+        if isinstance(i, int) and isinstance(j, int):
+            i, j = self._rect(i, j)[::2]  # Wrap negative indexes.
+            chunk = self.chunks.get((i // size, j // size))
+            return self.fill if chunk is None else chunk[i % size, j % size]
+        if isinstance(i, np.ndarray) and isinstance(j, np.ndarray):
+            out = np.full(np.broadcast_shapes(i.shape, j.shape), self.fill, self.dtype)
+            flat_out = out.reshape(-1)
+            flat_i, flat_j = self._wrap_arrays(i, j)
+            for chunk_key, positions in self._flat_chunks(flat_i, flat_j):
+                chunk = self.chunks.get(chunk_key)
+                if chunk is not None:
+                    chunk_index = flat_i[positions] % size, flat_j[positions] % size
+                    flat_out[positions] = chunk[chunk_index]
+            return out
+        top, bottom, left, right = self._rect(i, j)
+        out = np.full((bottom - top, right - left), self.fill, self.dtype)
+        for ci, chunk_rows, out_rows in _chunk_slices(top, bottom, size):
+            for cj, chunk_cols, out_cols in _chunk_slices(left, right, size):
+                chunk = self.chunks.get((ci, cj))
+                if chunk is not None:
+                    out[out_rows, out_cols] = chunk[chunk_rows, chunk_cols]
+        if isinstance(i, int):
+            out = out[0]
+        if isinstance(j, int):
+            out = out[..., 0]
+        return out
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        i, j = self._normalize(key)
+        size = self.chunk_size
+        if key is Ellipsis and np.ndim(value) == 0:
+            # Filling the whole array frees every chunk.
+            self.fill = self.dtype.type(value)
+            self.chunks.clear()
+            return
+        if isinstance(i, int) and isinstance(j, int):
+            i, j = self._rect(i, j)[::2]
+            self._get_chunk((i // size, j // size))[i % size, j % size] = value
+            return
+        if isinstance(i, np.ndarray) and isinstance(j, np.ndarray):
+            shape = np.broadcast_shapes(i.shape, j.shape)
+            values = np.broadcast_to(np.asarray(value, self.dtype), shape).reshape(-1)
+            flat_i, flat_j = self._wrap_arrays(i, j)
+            for chunk_key, positions in self._flat_chunks(flat_i, flat_j):
+                chunk_index = flat_i[positions] % size, flat_j[positions] % size
+                self._get_chunk(chunk_key)[chunk_index] = values[positions]
+            return
+        top, bottom, left, right = self._rect(i, j)
+        values = np.asarray(value, self.dtype)
+        scalar = values.ndim == 0
+        if not scalar and values.shape != (bottom - top, right - left):
+            values = np.broadcast_to(values, (bottom - top, right - left))
+        for ci, chunk_rows, out_rows in _chunk_slices(top, bottom, size):
+            for cj, chunk_cols, out_cols in _chunk_slices(left, right, size):
+                part = values if scalar else values[out_rows, out_cols]
+                chunk = self.chunks.get((ci, cj))
+                if chunk is None:
+                    if (part == self.fill).all():
+                        continue  # Leave unallocated chunks untouched.
+                    chunk = self._get_chunk((ci, cj))
+                chunk[chunk_rows, chunk_cols] = part
+
+    def prune(self) -> None:
+        """Free any allocated chunks which only hold the fill value."""
+        for key, chunk in list(self.chunks.items()):
+            if (chunk == self.fill).all():
+                del self.chunks[key]
+
+    def take(self, values: np.ndarray) -> ChunkedArray:
+        """Return a new array of `values` indexed by this arrays contents.
+
+        This works like `np.take` and keeps the same chunks allocated.
+        """
+        values = np.asarray(values)
+        result = ChunkedArray(
+            self.shape, values.dtype, values[self.fill], self.chunk_size
+        )
+        for key, chunk in self.chunks.items():
+            result.chunks[key] = np.take(values, chunk)
+        return result
+
+
+class _TransposedView:
+    """Indexes a ChunkedArray with its axes swapped, like `ndarray.T`."""
+
+    def __init__(self, array: ChunkedArray) -> None:
+        self.array = array
+
+    def __getitem__(self, key: Any) -> Any:
+        if key is Ellipsis:
+            return self.array[...].T
+        x, y = key
+        result = self.array[y, x]
+        if isinstance(x, slice) and isinstance(y, slice):
+            return result.T
+        return result
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if key is Ellipsis:
+            self.array[...] = np.asarray(value).T
+            return
+        x, y = key
+        if isinstance(x, slice) and isinstance(y, slice):
+            value = np.asarray(value).T
+        self.array[y, x] = value
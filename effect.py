@@ -17,8 +17,7 @@ def __init__(self, amount: int = 4):
         self.amount = amount
 
     def apply(self, action: Action, entity: Actor) -> None:
-        if not entity.fighter:
+        if not entity.alive:
             return
-        fighter = entity.fighter
-        fighter.hp = min(fighter.hp + self.amount, fighter.max_hp)
-        action.report(f"{fighter.name} heal {self.amount} hp.")
+        entity.hp = min(entity.hp + self.amount, entity.max_hp)
+        action.report(f"{entity.fighter.name} heal {self.amount} hp.")
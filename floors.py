@@ -0,0 +1,181 @@
+"""Multiple dungeon floors joined by stairs.
+
+Only the active floor is kept as a GameMap.  Other floors are generated on
+their first visit, and are pickled and compressed while the player is away
+from them.  Once the compressed floors take up more than a memory budget the
+least recently visited ones are moved to a temporary directory on disk.
+"""
+from __future__ import annotations
+
+import io
+import lzma
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+import numpy as np
+
+import procgen.dungeon
+
+if TYPE_CHECKING:
+    from gamemap import GameMap
+    from model import Model
+
+
+def nearest_free_space(gamemap: GameMap, xy: Tuple[int, int]) -> Tuple[int, int]:
+    """Return the closest position to `xy` which is not blocked."""
+    if not gamemap.is_blocked(*xy):
+        return xy
+    free = np.argwhere(
+        (np.asarray(gamemap.move_cost) != 0) & ~np.asarray(gamemap.actor_mask)
+    )
+    assert len(free), "No free space on this floor."
+    distance = np.abs(free - xy[::-1]).max(axis=1)
+    i, j = free[distance.argmin()].tolist()
+    return j, i
+
+
+class _FloorPickler(pickle.Pickler):
+    """Pickles a floor without the model or the player it refers to."""
+
+    def __init__(self, file: io.BytesIO, shared: Dict[int, str]) -> None:
+        super().__init__(file, protocol=5)
+        self.shared = shared  # id(obj): persistent_id
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        return self.shared.get(id(obj))
+
+
+class _FloorUnpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, shared: Dict[str, Any]) -> None:
+        super().__init__(file)
+        self.shared = shared  # persistent_id: obj
+
+    def persistent_load(self, pid: str) -> Any:
+        return self.shared[pid]
+
+
+class FloorStack:
+    """Holds the inactive floors of a Model and moves the player between them.
+
+    `packed` holds compressed floors in memory, from the least to the most
+    recently visited.  `spilled` holds the paths of floors evicted to disk.
+    """
+
+    MEMORY_BUDGET = 8 * 1024 * 1024  # Bytes of compressed floors kept in memory.
+
+    def __init__(self, model: Model) -> None:
+        self.model = model
+        self.memory_budget = self.MEMORY_BUDGET
+        self.packed: OrderedDict[int, bytes] = OrderedDict()  # depth: data
+        self.spilled: Dict[int, str] = {}  # depth: path
+        self._spill_dir: Optional[tempfile.TemporaryDirectory[str]] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Bring spilled floors back into memory, they're saved with the model."""
+        state = self.__dict__.copy()
+        packed = self.packed.copy()
+        for depth, path in self.spilled.items():
+            with open(path, "rb") as f:
+                packed[depth] = f.read()
+        state["packed"] = packed
+        state["spilled"] = {}
+        state["_spill_dir"] = None
+        return state
+
+    def __contains__(self, depth: int) -> bool:
+        """Return True if the floor at `depth` is stored here."""
+        return depth in self.packed or depth in self.spilled
+
+    @property
+    def packed_size(self) -> int:
+        """The number of bytes used by the floors kept in memory."""
+        return sum(len(data) for data in self.packed.values())
+
+    def _shared_objects(self) -> Dict[str, Any]:
+        """Objects which are not part of any one floor."""
+        return {"model": self.model, "player": self.model.player}
+
+    def store(self, gamemap: GameMap) -> None:
+        """Pack an inactive floor, evicting older floors if over budget."""
+        gamemap.actor_store.compact()
+        shared = self._shared_objects()
+        file = io.BytesIO()
+        _FloorPickler(file, {id(obj): pid for pid, obj in shared.items()}).dump(
+            (self.model.scheduler.current_tick, gamemap)
+        )
+        self.packed[gamemap.depth] = lzma.compress(file.getbuffer())
+        while len(self.packed) > 1 and self.packed_size > self.memory_budget:
+            self.spill(next(iter(self.packed)))
+
+    def spill(self, depth: int) -> None:
+        """Move a packed floor from memory to a temporary file."""
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.TemporaryDirectory(prefix="floors-")
+        path = os.path.join(self._spill_dir.name, f"floor-{depth}.xz")
+        with open(path, "wb") as f:
+            f.write(self.packed.pop(depth))
+        self.spilled[depth] = path
+
+    def restore(self, depth: int) -> Tuple[int, GameMap]:
+        """Remove and return the (suspended_tick, gamemap) of a stored floor."""
+        if depth in self.spilled:
+            path = self.spilled.pop(depth)
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+        else:
+            data = self.packed.pop(depth)
+        file = io.BytesIO(lzma.decompress(data))
+        suspended_tick, gamemap = _FloorUnpickler(file, self._shared_objects()).load()
+        return suspended_tick, gamemap
+
+    def suspend(self, gamemap: GameMap) -> None:
+        """Remove the turns of every actor on a floor the player has left."""
+        tickets = [
+            actor.ticket
+            for actor in gamemap.actors
+            if actor.ticket and actor is not self.model.player
+        ]
+        self.model.scheduler.remove(tickets)
+
+    def resume(self, gamemap: GameMap, suspended_tick: int) -> None:
+        """Schedule the actors of a restored floor, keeping their turn order."""
+        scheduler = self.model.scheduler
+        waiting = [(actor.ticket, actor) for actor in gamemap.actors if actor.ticket]
+        waiting.sort(key=lambda pair: (pair[0].tick, pair[0].unique_id))
+        for ticket, actor in waiting:
+            actor.ticket = scheduler.schedule(ticket.tick - suspended_tick, actor.act)
+
+    def change_floor(self, depth: int) -> None:
+        """Move the player to the floor at `depth`, generating it if needed.
+
+        The player arrives on the stairs leading back to the previous floor.
+        This is called during the players turn, after their next turn has
+        been scheduled.
+        """
+        model = self.model
+        player = model.player
+        old_map = model.active_map
+        self.suspend(old_map)
+        if depth in self:
+            suspended_tick, new_map = self.restore(depth)
+            self.resume(new_map, suspended_tick)
+        else:
+            # Monsters of a new floor are scheduled as they're spawned.
+            new_map = procgen.dungeon.generate(
+                model, old_map.width, old_map.height, depth
+            )
+        arrival = [
+            xy
+            for xy, change in new_map.stairs.items()
+            if new_map.depth + change == old_map.depth
+        ]
+        xy = arrival[0] if arrival else player.location.xy
+        player.location = new_map[nearest_free_space(new_map, xy)]
+        new_map.player = player
+        model.active_map = new_map
+        new_map.update_fov()
+        self.store(old_map)
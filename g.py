@@ -1,5 +1,14 @@
 """Python module to define and hold global variables."""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
 import tcod
 
+if TYPE_CHECKING:
+    from replay import Replay, Trace
+
 context: tcod.context.Context  # Active context.
 console: tcod.console.Console  # Active console.
+recording: Optional[Trace] = None  # Player command keys are added to this.
+replay: Optional[Replay] = None  # Input is read from this instead while set.
@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Set, Tuple
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Set, Tuple
 
 import numpy as np
 import tcod
 
+import instrument
+from actorstore import ActorStore
+from chunks import ChunkedArray
 from location import Location
 
 if TYPE_CHECKING:
     from actor import Actor
-    from graphic import Graphic
     from items import Item
     from model import Model
 
@@ -24,6 +26,16 @@
         ("dark", tile_graphic),
     ]
 )
+# Data type for the drawable entities of a map, see GameMap.entity_array.
+entity_dt = np.dtype(
+    [
+        ("x", np.int32),
+        ("y", np.int32),
+        ("ch", np.int32),
+        ("fg", "3B"),
+        ("render_order", np.int32),
+    ]
+)
 
 
 class Tile(NamedTuple):
@@ -35,6 +47,15 @@ class Tile(NamedTuple):
     dark: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]]
 
 
+# The default tile of a new map, impassable and invisible.
+VOID = Tile(
+    move_cost=0,
+    transparent=False,
+    light=(0, (0, 0, 0), (0, 0, 0)),
+    dark=(0, (0, 0, 0), (0, 0, 0)),
+)
+
+
 class MapLocation(Location):
     def __init__(self, gamemap: GameMap, x: int, y: int):
         self.map = gamemap
@@ -43,54 +64,285 @@ def __init__(self, gamemap: GameMap, x: int, y: int):
 
 
 class GameMap:
-    """An object which holds the tile and entity data for a single floor."""
+    """An object which holds the tile and entity data for a single floor.
+
+    Map arrays are stored in chunks, see ChunkedArray.  Only the chunks near
+    the camera and the player are read each turn, and chunks which were never
+    written to take no memory.
+    """
 
     DARKNESS = np.asarray((0, (0, 0, 0), (0, 0, 0)), dtype=tile_graphic)
+    FOV_CACHE_SIZE = 8  # Number of recent FOV results to keep.
+    FOV_RADIUS = 10
+    CHASE_RANGE = 10  # How far past FOV_RADIUS chasing monsters path around walls.
+    DORMANT_DISTANCE = 20  # Idle monsters further than this stop taking turns.
+    DORMANT_REGION = 16  # Width and height of the regions of `dormant`.
 
     player: Actor
 
-    def __init__(self, model: Model, width: int, height: int):
+    def __init__(self, model: Model, width: int, height: int, depth: int = 0):
         self.model = model
+        self.depth = depth  # Floor number, starting from 0.
         self.width = width
         self.height = height
         self.shape = height, width
-        self.tiles = np.zeros(self.shape, dtype=tile_dt)
-        self.explored = np.zeros(self.shape, dtype=bool)
-        self.visible = np.zeros(self.shape, dtype=bool)
+        # Tiles are stored as indexes into `palette`.
+        self.palette: List[Tile] = [VOID]
+        self.tile_ids = ChunkedArray(self.shape, np.uint8)
+        self.explored = ChunkedArray(self.shape, bool)
+        self.visible = ChunkedArray(self.shape, bool)
         self.actors: Set[Actor] = set()
+        self.actor_store = ActorStore()
+        self.actor_index: Dict[Tuple[int, int], Actor] = {}  # x,y: actor lookup.
+        self.actor_mask = ChunkedArray(self.shape, bool)  # True where occupied.
         self.items: Dict[Tuple[int, int], List[Item]] = {}
+        self.stairs: Dict[Tuple[int, int], int] = {}  # x,y: change in depth.
+        # Actors with no ticket, grouped by region and in the order they slept.
+        self.dormant: Dict[Tuple[int, int], Dict[Actor, None]] = {}
         self.camera_xy = (0, 0)  # Camera center position.
+        # Must be incremented whenever `tile_ids` is edited.
+        self.tiles_revision = 0
+        self._tile_cache_revision = -1
+        self._palette_array = np.zeros(0, dtype=tile_dt)
+        self._move_cost = ChunkedArray(self.shape, np.uint8)
+        self._transparent = ChunkedArray(self.shape, bool)
+        # The flow field of `get_player_distance` and the x,y of its corner.
+        self._player_distance: Optional[Tuple[np.ndarray, Tuple[int, int]]] = None
+        self._player_distance_key: Optional[Tuple[Tuple[int, int], int]] = None
+        self._fov_cache: OrderedDict[Tuple[Tuple[int, int], int], np.ndarray]
+        self._fov_cache = OrderedDict()
+        self._fov_key: Optional[Tuple[Tuple[int, int], int]] = None
+        self._fov_window: Optional[Tuple[slice, slice]] = None  # Last visible area.
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Skip cached data when pickling, it will be rebuilt on demand."""
+        state = self.__dict__.copy()
+        state["_tile_cache_revision"] = -1
+        state["_palette_array"] = np.zeros(0, dtype=tile_dt)
+        state["_move_cost"] = ChunkedArray(self.shape, np.uint8)
+        state["_transparent"] = ChunkedArray(self.shape, bool)
+        state["_player_distance"] = None
+        state["_player_distance_key"] = None
+        state["_fov_cache"] = OrderedDict()
+        state["_fov_key"] = None
+        return state
+
+    def get_tile_id(self, tile: Tile) -> int:
+        """Return the `tile_ids` value for `tile`, adding it to the palette."""
+        if tile not in self.palette:
+            assert len(self.palette) <= np.iinfo(self.tile_ids.dtype).max
+            self.palette.append(tile)
+        return self.palette.index(tile)
+
+    def _get_palette_array(self) -> np.ndarray:
+        """Return `palette` as a tile_dt array, tiles are only ever appended."""
+        if len(self._palette_array) != len(self.palette):
+            self._palette_array = np.array(self.palette, dtype=tile_dt)
+        return self._palette_array
+
+    def _update_tile_cache(self) -> None:
+        """Rebuild the arrays derived from `tile_ids` if they're out of date."""
+        if self._tile_cache_revision == self.tiles_revision:
+            return
+        palette = self._get_palette_array()
+        self._move_cost = self.tile_ids.take(palette["move_cost"])
+        self._transparent = self.tile_ids.take(palette["transparent"])
+        self._tile_cache_revision = self.tiles_revision
+
+    @property
+    def move_cost(self) -> ChunkedArray:
+        """The movement cost of every tile, zero for impassable tiles.
+
+        This is derived from `tile_ids`, edit that array instead.
+        """
+        self._update_tile_cache()
+        return self._move_cost
+
+    @property
+    def transparent(self) -> ChunkedArray:
+        """True for each tile which can be seen through."""
+        self._update_tile_cache()
+        return self._transparent
+
+    def get_tile_graphics(
+        self, index: Tuple[slice, slice]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the (light, dark) graphics for the tiles at `index`."""
+        palette = self._get_palette_array()
+        tile_ids = self.tile_ids[index]
+        # np.take is much faster than fancy indexing for structured arrays.
+        light = np.take(palette["light"], tile_ids)
+        dark = np.take(palette["dark"], tile_ids)
+        return light, dark
 
     def is_blocked(self, x: int, y: int) -> bool:
         """Return True if this position is impassible."""
         if not (0 <= x < self.width and 0 <= y < self.height):
             return True
-        if not self.tiles[y, x]["move_cost"]:
+        if not self.move_cost[y, x]:
             return True
-        if any(actor.location.xy == (x, y) for actor in self.actors):
+        if (x, y) in self.actor_index:
             return True
 
         return False
 
     def fighter_at(self, x: int, y: int) -> Optional[Actor]:
         """Return any fighter entity found at this position."""
-        for actor in self.actors:
-            if actor.location.xy == (x, y):
-                return actor
-        return None
+        return self.actor_index.get((x, y))
+
+    def add_actor(self, actor: Actor) -> None:
+        """Add an actor to this map and index its current position.
+
+        This is called automatically by the Actor class.
+        """
+        assert actor.location.map is self
+        if actor.store is not self.actor_store:
+            # Move the actors row from the store of its previous map.
+            old_store, old_row = actor.store, actor.row
+            actor.store = self.actor_store
+            actor.row = self.actor_store.add(actor, old_store.data[old_row])
+            old_store.release(old_row)
+        self.actors.add(actor)
+        self.actor_index[actor.location.xy] = actor
+        self.actor_mask[actor.location.ij] = True
+
+    def move_actor(self, actor: Actor, old_xy: Tuple[int, int]) -> None:
+        """Update the indexes of an actor which has moved from `old_xy`."""
+        if self.actor_index.get(old_xy) is actor:
+            del self.actor_index[old_xy]
+            self.actor_mask[old_xy[::-1]] = False
+        self.actor_index[actor.location.xy] = actor
+        self.actor_mask[actor.location.ij] = True
+        self.actor_store.data["x"][actor.row] = actor.location.x
+        self.actor_store.data["y"][actor.row] = actor.location.y
+
+    def remove_actor(self, actor: Actor) -> None:
+        """Remove an actor from this map and from the position index."""
+        self.actors.remove(actor)
+        xy = actor.location.xy
+        self.dormant.get(self._get_region(*xy), {}).pop(actor, None)
+        if self.actor_index.get(xy) is actor:
+            del self.actor_index[xy]
+            self.actor_mask[actor.location.ij] = False
+
+    def _get_region(self, x: int, y: int) -> Tuple[int, int]:
+        """Return the key of `dormant` for the region containing x,y."""
+        return x // self.DORMANT_REGION, y // self.DORMANT_REGION
+
+    def add_dormant(self, actor: Actor) -> None:
+        """Remove an actors ticket during its turn, until `wake_dormant`."""
+        assert actor.ticket is not None
+        self.model.scheduler.unschedule(actor.ticket)
+        actor.ticket = None
+        region = self._get_region(*actor.location.xy)
+        self.dormant.setdefault(region, {})[actor] = None
+
+    def wake_dormant(self) -> None:
+        """Schedule the dormant actors within DORMANT_DISTANCE of the player.
+
+        Only the regions around the player are checked, so this is cheap no
+        matter how many actors are dormant.
+        """
+        if not self.dormant:
+            return
+        x, y = self.player.location.xy
+        distance = self.DORMANT_DISTANCE
+        left, top = self._get_region(x - distance, y - distance)
+        right, bottom = self._get_region(x + distance, y + distance)
+        for region_y in range(top, bottom + 1):
+            for region_x in range(left, right + 1):
+                region = self.dormant.get((region_x, region_y))
+                if region is None:
+                    continue
+                for actor in list(region):
+                    if actor.location.distance_to(x, y) <= distance:
+                        del region[actor]
+                        actor.ticket = self.model.scheduler.schedule(0, actor.act)
+                if not region:
+                    del self.dormant[region_x, region_y]
+
+    def get_player_distance(self) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Return the walking distance to the player around the player.
+
+        This is a flow field shared by all monsters chasing the player.  Only
+        a window of `FOV_RADIUS` plus `CHASE_RANGE` around the player is
+        covered, so the cost of this does not depend on the map size.  Returns
+        the (distance, (x, y)) where x,y is the map position of distance[0, 0].
+
+        This is only recomputed once the player moves or `tiles_revision`
+        changes.  Unreachable tiles have the maximum value of the arrays dtype.
+        """
+        key = self.player.location.xy, self.tiles_revision
+        if self._player_distance is None or self._player_distance_key != key:
+            x, y = self.player.location.xy
+            window = self.get_window(x, y, self.FOV_RADIUS + self.CHASE_RANGE)
+            y0, x0 = window[0].start, window[1].start
+            # Read the window directly instead of rebuilding self.move_cost.
+            cost = np.take(
+                self._get_palette_array()["move_cost"], self.tile_ids[window]
+            )
+            graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
+            pf = tcod.path.Pathfinder(graph)
+            pf.add_root((y - y0, x - x0))
+            pf.resolve()
+            self._player_distance = pf.distance, (x0, y0)
+            self._player_distance_key = key
+        return self._player_distance
+
+    def get_window(self, x: int, y: int, radius: int) -> Tuple[slice, slice]:
+        """Return the area of the map within `radius` tiles of x,y."""
+        return np.s_[
+            max(0, y - radius) : y + radius + 1, max(0, x - radius) : x + radius + 1
+        ]
+
+    def get_fov_window(self, x: int, y: int) -> Tuple[slice, slice]:
+        """Return the area of the map which can be seen from x,y."""
+        return self.get_window(x, y, self.FOV_RADIUS)
 
+    @instrument.timed("update_fov")
     def update_fov(self) -> None:
-        """Update the field of view around the player."""
+        """Update the field of view around the player.
+
+        Only a window of `FOV_RADIUS` around the player is computed, and only
+        that window and the previous one are written to `visible` and
+        `explored`, so the cost of this does not depend on the map size.
+        Results are cached by the player position and `tiles_revision`, so
+        waiting in place or returning to a recent position is cheap.
+        """
         if not self.player.location:
             return
-        self.visible = tcod.map.compute_fov(
-            transparency=self.tiles["transparent"],
-            pov=self.player.location.ij,
-            radius=10,
-            light_walls=True,
-            algorithm=tcod.FOV_RESTRICTIVE,
-        )
-        self.explored |= self.visible
+        key = self.player.location.xy, self.tiles_revision
+        if key == self._fov_key:
+            return  # The visible area has not changed.
+        x, y = self.player.location.xy
+        window = self.get_fov_window(x, y)
+        visible = self._fov_cache.get(key)
+        if visible is None:
+            # Read the window directly instead of rebuilding self.transparent.
+            transparency = np.take(
+                self._get_palette_array()["transparent"], self.tile_ids[window]
+            )
+            visible = tcod.map.compute_fov(
+                transparency=transparency,
+                pov=(y - window[0].start, x - window[1].start),
+                radius=self.FOV_RADIUS,
+                light_walls=True,
+                algorithm=tcod.FOV_RESTRICTIVE,
+            )
+            visible.flags.writeable = False  # Shared with the cache.
+            self._fov_cache[key] = visible
+            if len(self._fov_cache) > self.FOV_CACHE_SIZE:
+                self._fov_cache.popitem(last=False)
+        else:
+            self._fov_cache.move_to_end(key)
+        self._fov_key = key
+        if self._fov_window is not None:
+            self.visible[self._fov_window] = False
+        self.visible[window] = visible
+        self.visible.prune()  # Free chunks which are no longer in view.
+        self._fov_window = window
+        self.explored[window] |= visible
+        self.wake_dormant()
 
     def get_camera_pos(self, console: tcod.console.Console) -> Tuple[int, int]:
         """Get the upper left XY camera position, assuming camera_xy is the center."""
@@ -124,6 +376,7 @@ def get_camera_views(
 
         return screen_view, world_view
 
+    @instrument.timed("render")
     def render(self, console: tcod.console.Console) -> None:
         """Render this maps contents onto a console."""
         cam_x, cam_y = self.get_camera_pos(console)
@@ -132,33 +385,62 @@ def render(self, console: tcod.console.Console) -> None:
         screen_view, world_view = self.get_camera_views(console)
 
         # Draw the console based on visible or explored areas.
+        light, dark = self.get_tile_graphics(world_view)
         console.tiles_rgb[screen_view] = np.select(
             (self.visible[world_view], self.explored[world_view]),
-            (self.tiles["light"][world_view], self.tiles["dark"][world_view]),
+            (light, dark),
             self.DARKNESS,
         )
 
-        # Collect and filter the various entity objects.
-        visible_objs: Dict[Tuple[int, int], List[Graphic]] = defaultdict(list)
-        for obj in self.actors:
-            obj_x, obj_y = obj.location.x - cam_x, obj.location.y - cam_y
-            if not (0 <= obj_x < console.width and 0 <= obj_y < console.height):
-                continue
-            if not self.visible[obj.location.ij]:
-                continue
-            visible_objs[obj_y, obj_x].append(obj.fighter)
-        for (item_x, item_y), items in self.items.items():
-            obj_x, obj_y = item_x - cam_x, item_y - cam_y
-            if not (0 <= obj_x < console.width and 0 <= obj_y < console.height):
-                continue
-            if not self.visible[item_y, item_x]:
-                continue
-            visible_objs[obj_y, obj_x].extend(items)
+        # Collect the entities, then filter them to the visible camera area.
+        entities = self.entity_array()
+        screen_x = entities["x"] - cam_x
+        screen_y = entities["y"] - cam_y
+        in_view = (
+            (0 <= screen_x)
+            & (screen_x < console.width)
+            & (0 <= screen_y)
+            & (screen_y < console.height)
+        )
+        in_view[in_view] = self.visible[entities["y"][in_view], entities["x"][in_view]]
+        entities = entities[in_view]
+        screen_x = screen_x[in_view]
+        screen_y = screen_y[in_view]
+
+        # Keep the entity with the lowest render order on each tile, the
+        # stable sort keeps the earliest entity on ties.
+        order = np.argsort(entities["render_order"], kind="stable")
+        screen_index = screen_y[order] * console.width + screen_x[order]
+        _, first = np.unique(screen_index, return_index=True)
+        top = order[first]
 
         # Draw the visible entities.
-        for ij, graphics in visible_objs.items():
-            graphic = min(graphics)
-            console.tiles_rgb[["ch", "fg"]][ij] = graphic.char, graphic.color
+        console.tiles_rgb["ch"][screen_y[top], screen_x[top]] = entities["ch"][top]
+        console.tiles_rgb["fg"][screen_y[top], screen_x[top]] = entities["fg"][top]
+
+    def entity_array(self) -> np.ndarray:
+        """Return the positions and graphics of every actor and item on this map.
+
+        Actors come first, followed by items in the order they're stacked.
+        Actor graphics are taken from the class of their fighter.
+        """
+        store = self.actor_store
+        rows = store.living()
+        actors = np.zeros(len(rows), dtype=entity_dt)
+        actors["x"] = store.data["x"][rows]
+        actors["y"] = store.data["y"][rows]
+        if len(rows):
+            type_ids = store.data["type_id"][rows]
+            ch, fg, render_order = store.type_graphics()
+            actors["ch"] = ch[type_ids]
+            actors["fg"] = fg[type_ids]
+            actors["render_order"] = render_order[type_ids]
+        items: List[Tuple[int, int, int, Tuple[int, int, int], int]] = [
+            (x, y, item.char, item.color, item.render_order)
+            for (x, y), stack in self.items.items()
+            for item in stack
+        ]
+        return np.concatenate([actors, np.array(items, dtype=entity_dt)])
 
     def __getitem__(self, key: Tuple[int, int]) -> MapLocation:
         """Return the MapLocation for an x,y index."""
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Run game sessions without a window.
+
+The player is controlled by an AI instead of the keyboard, and the game can
+optionally be rendered to an off-screen console.  This is used to measure
+turns per second and to soak test many sessions on machines without a
+display.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+import warnings
+from typing import NamedTuple, Optional, Tuple, Type
+
+import tcod
+
+import g
+import procgen.dungeon
+import rendering
+import replay
+import states
+import tqueue
+from actions import Action, ai
+from model import Model
+
+
+class SessionResult(NamedTuple):
+    """Statistics for a single headless session."""
+
+    seed: int
+    player_turns: int
+    actor_turns: int
+    ticks: int
+    seconds: float
+    player_dead: bool
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.player_turns / self.seconds if self.seconds else 0.0
+
+
+def new_model(
+    width: int = 80,
+    height: int = 45,
+    player_ai: Type[Action] = ai.AutoPlayer,
+    scheduler: str = "heap",
+    seed: Optional[int] = None,
+) -> Model:
+    """Return a new Model with a generated map and a computer controlled player.
+
+    `scheduler` is the name of the turn queue backend from `tqueue.SCHEDULERS`.
+    """
+    model = Model(tqueue.SCHEDULERS[scheduler](), seed)
+    model.active_map = procgen.dungeon.generate(model, width, height)
+    model.player.ai = player_ai(model.player)
+    return model
+
+
+def simulate(
+    model: Model,
+    max_turns: int,
+    console: Optional[tcod.console.Console] = None,
+    batch: bool = False,
+) -> SessionResult:
+    """Run `model` until the player dies or has taken `max_turns` turns.
+
+    If `console` is given then the main view is rendered to it after each of
+    the players turns.  If `batch` is True then monster turns are taken with
+    `ai.take_monster_turns`, which gives the same results.
+
+    This also stops once the input of an active replay runs out.
+    """
+    player_turns = actor_turns = 0
+    start_time = time.perf_counter()
+    try:
+        while player_turns < max_turns and not model.is_player_dead:
+            if batch:
+                monster_turns = ai.take_monster_turns(model)
+                if monster_turns:
+                    actor_turns += monster_turns
+                    continue
+            is_player_turn = model.scheduler.peek() is model.player.ticket
+            try:
+                model.scheduler.invoke_next()
+            except states.SaveAndQuit:
+                continue  # A replay left to the main menu, then continued.
+            actor_turns += 1
+            if is_player_turn:
+                player_turns += 1
+                if console is not None:
+                    rendering.draw_main_view(model, console)
+    except replay.ReplayEnd:
+        pass
+    return SessionResult(
+        seed=-1,
+        player_turns=player_turns,
+        actor_turns=actor_turns,
+        ticks=model.scheduler.current_tick,
+        seconds=time.perf_counter() - start_time,
+        player_dead=model.is_player_dead,
+    )
+
+
+def run_session(
+    seed: int,
+    max_turns: int,
+    width: int = 80,
+    height: int = 45,
+    render: bool = False,
+    verbose: bool = False,
+    scheduler: str = "heap",
+    batch: bool = False,
+) -> SessionResult:
+    """Generate and simulate a new seeded session."""
+    console = tcod.Console(80, 50) if render else None
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        model = new_model(width, height, scheduler=scheduler, seed=seed)
+        result = simulate(model, max_turns, console, batch)
+    return result._replace(seed=seed)
+
+
+def replay_session(
+    path: str,
+    render: bool = False,
+    verbose: bool = False,
+    scheduler: str = "heap",
+    batch: bool = False,
+) -> Tuple[SessionResult, Model]:
+    """Replay the trace at `path` as fast as possible, see the replay module.
+
+    Returns the result along with the Model at the end of the replay.
+    """
+    trace = replay.load_trace(path)
+    console = tcod.Console(80, 50) if render else None
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        model = new_model(
+            trace.width, trace.height, ai.PlayerControl, scheduler, trace.seed
+        )
+        g.replay = replay.Replay(trace.keys)
+        try:
+            result = simulate(model, sys.maxsize, console, batch)
+        finally:
+            g.replay = None
+    return result._replace(seed=trace.seed), model
+
+
+def print_result(result: SessionResult) -> None:
+    print(
+        f"seed={result.seed} turns={result.player_turns} actors={result.actor_turns}"
+        f" ticks={result.ticks} dead={result.player_dead}"
+        f" turns/s={result.turns_per_second:.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1, help="Sessions to run.")
+    parser.add_argument("--turns", type=int, default=1000, help="Turns per session.")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the first session."
+    )
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=45)
+    parser.add_argument(
+        "--render", action="store_true", help="Render to an off-screen console."
+    )
+    parser.add_argument("--verbose", action="store_true", help="Print game messages.")
+    parser.add_argument(
+        "--scheduler",
+        choices=sorted(tqueue.SCHEDULERS),
+        default="heap",
+        help="Turn queue backend.",
+    )
+    parser.add_argument(
+        "--batch", action="store_true", help="Take monster turns in groups."
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="TRACE",
+        help="Replay a trace recorded by the game instead of running sessions.",
+    )
+    args = parser.parse_args()
+
+    if args.replay:
+        result, model = replay_session(
+            args.replay, args.render, args.verbose, args.scheduler, args.batch
+        )
+        print_result(result)
+        print(model)
+        return
+
+    total_turns = 0
+    total_seconds = 0.0
+    for seed in range(args.seed, args.seed + args.sessions):
+        try:
+            result = run_session(
+                seed,
+                args.turns,
+                args.width,
+                args.height,
+                args.render,
+                args.verbose,
+                args.scheduler,
+                args.batch,
+            )
+        except Exception:
+            print(f"Session with seed {seed} failed.", file=sys.stderr)
+            raise
+        total_turns += result.player_turns
+        total_seconds += result.seconds
+        print_result(result)
+    if total_seconds:
+        print(f"Total: {total_turns} turns, {total_turns / total_seconds:.1f} turns/s")
+
+
+if __name__ == "__main__":
+    if not sys.warnoptions:
+        warnings.simplefilter("default")  # Show all warnings once by default.
+    main()
@@ -0,0 +1,168 @@
+"""Optional timings of the games hot paths.
+
+Collection is off by default.  Set the TIMINGS environment variable to a file
+path to collect from startup, or press F12 to toggle collection in game.
+The collected timings are written to that path as JSON on exit, or to
+`DEFAULT_PATH` if TIMINGS was not set.
+
+Code is timed with `timer` blocks or `timed` functions.  Timings are grouped
+by phase, such as "plan", and by a label within that phase, such as the class
+of the actor which was planning.  While disabled these only cost a check of
+`enabled`.
+"""
+from __future__ import annotations
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Callable, ContextManager, Deque, Dict, Optional, TypeVar
+
+import numpy as np
+
+ENV_VAR = "TIMINGS"
+DEFAULT_PATH = "timings.json"
+MAX_SAMPLES = 10_000  # Recent samples kept per label for percentiles.
+PERCENTILES = (50, 90, 99)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Stat:
+    """The call count, total time, and recent samples of one label."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """Return the count, and the total, mean and percentiles in milliseconds.
+
+        Percentiles only cover the last `MAX_SAMPLES` samples.
+        """
+        samples = np.fromiter(self.samples, float, len(self.samples)) * 1000
+        result = {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count,
+        }
+        for percentile, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+            result[f"p{percentile}_ms"] = float(value)
+        result["max_ms"] = float(samples.max())
+        return result
+
+
+class Timings:
+    """Stats grouped by phase and then by label."""
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, Dict[str, Stat]] = {}
+
+    def add(self, phase: str, label: str, seconds: float) -> None:
+        labels = self.phases.setdefault(phase, {})
+        stat = labels.get(label)
+        if stat is None:
+            stat = labels[label] = Stat()
+        stat.add(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        return {
+            phase: {label: stat.summary() for label, stat in sorted(labels.items())}
+            for phase, labels in sorted(self.phases.items())
+        }
+
+    def dump(self, path: str) -> None:
+        """Write the summary of these timings to `path` as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+timings = Timings()
+enabled = False
+path: Optional[str] = None  # Where timings are dumped on exit.
+_dump_registered = False
+
+
+class _Timer:
+    """Adds the time spent within a with block to `timings`."""
+
+    __slots__ = ("phase", "label", "start")
+
+    def __init__(self, phase: str, label: str) -> None:
+        self.phase = phase
+        self.label = label
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        timings.add(self.phase, self.label, time.perf_counter() - self.start)
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def timer(phase: str, label: str = "") -> ContextManager[None]:
+    """Return a context manager which times its block, if enabled."""
+    if not enabled:
+        return _NULL_TIMER
+    return _Timer(phase, label)
+
+
+def timed(phase: str) -> Callable[[F], F]:
+    """Decorate a function so that each call is timed, if enabled."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Timer(phase, ""):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def _dump_on_exit() -> None:
+    if timings.phases:
+        timings.dump(path or DEFAULT_PATH)
+
+
+def enable() -> None:
+    """Start collecting timings, they'll be dumped when the program exits."""
+    global enabled, _dump_registered
+    if not _dump_registered:
+        atexit.register(_dump_on_exit)
+        _dump_registered = True
+    enabled = True
+
+
+def disable() -> None:
+    """Stop collecting timings, collected timings are kept."""
+    global enabled
+    enabled = False
+
+
+def toggle() -> bool:
+    """Toggle collection and return True if it's now enabled."""
+    if enabled:
+        disable()
+    else:
+        enable()
+    return enabled
+
+
+if os.environ.get(ENV_VAR):
+    path = os.environ[ENV_VAR]
+    enable()
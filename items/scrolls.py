@@ -26,11 +26,9 @@ class LightningScroll(Scroll):
 
     @staticmethod
     def iter_targets(action: ActionWithItem) -> Iterator[Actor]:
-        for actor in action.map.actors:
+        for actor in action.map.actor_store.in_mask(action.map.visible):
             if actor is action.actor:
                 continue
-            if not action.map.visible[actor.location.ij]:
-                continue
             yield actor
 
     @staticmethod
@@ -71,10 +69,7 @@ def action_activate(self, action: ActionWithItem) -> None:
             f"The fireball explodes, burning everything within {self.radius} tiles!"
         )
 
-        # Use a copy of the actors list since it may be edited during the loop.
-        for actor in list(action.map.actors):
-            if actor.location.distance_to(*selected_xy) > self.radius:
-                continue
+        for actor in action.map.actor_store.within(*selected_xy, self.radius):
             action.report(
                 f"The {actor.fighter.name} gets burned for {self.damage} hit points"
             )
@@ -100,10 +95,8 @@ def action_activate(self, action: ActionWithItem) -> None:
             raise Impossible("No enemy selected to genocide.")
 
         type_fighter = type(selected_actor.fighter)
-        # Use a copy of the actors list since it may be edited during the loop.
-        for actor in list(action.map.actors):
-            if isinstance(actor.fighter, type_fighter):
-                actor.die()
+        for actor in action.map.actor_store.of_type(type_fighter):
+            actor.die()
 
         action.report(f"The {selected_actor.fighter.name} has been genocided")
         self.consume(action)
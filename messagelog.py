@@ -0,0 +1,86 @@
+"""The message log shown under the map.
+
+Only the most recent messages are kept, older messages can be appended to a
+text file as they are dropped.  Set the MESSAGE_LOG environment variable to a
+file path to keep the older messages of new games there.
+"""
+from __future__ import annotations
+
+import os
+from collections import deque
+from typing import Deque, Iterator, Optional, Tuple
+
+import tcod.console
+
+ENV_VAR = "MESSAGE_LOG"
+
+
+def get_spill_path() -> Optional[str]:
+    """Return the path dropped messages are appended to, or None to discard."""
+    return os.environ.get(ENV_VAR) or None
+
+
+class Message:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.count = 1
+        self._layout: Optional[Tuple[int, int, str, int]] = None
+
+    def __str__(self) -> str:
+        if self.count > 1:
+            return f"{self.text} (x{self.count})"
+        return self.text
+
+    def layout(self, width: int) -> Tuple[str, int]:
+        """Return the (text, height) of this message wrapped to `width`.
+
+        The result is cached until the width or the count of this message
+        changes.
+        """
+        layout = self._layout
+        if layout is None or layout[:2] != (width, self.count):
+            text = str(self)
+            height = tcod.console.get_height_rect(width, text)
+            layout = self._layout = width, self.count, text, height
+        return layout[2], layout[3]
+
+
+class MessageLog:
+    """A fixed capacity log of messages, repeated messages are stacked.
+
+    Once full, the oldest message is dropped for each new one.  If `spill_path`
+    is set then dropped messages are appended to that file.
+    """
+
+    CAPACITY = 1000  # Messages kept in memory.
+
+    def __init__(
+        self, capacity: int = CAPACITY, spill_path: Optional[str] = None
+    ) -> None:
+        self.messages: Deque[Message] = deque(maxlen=capacity)
+        self.spill_path = spill_path
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        """Iterate over messages from the oldest to the newest."""
+        return iter(self.messages)
+
+    def __reversed__(self) -> Iterator[Message]:
+        """Iterate over messages from the newest to the oldest."""
+        return reversed(self.messages)
+
+    def __getitem__(self, index: int) -> Message:
+        return self.messages[index]
+
+    def add(self, text: str) -> None:
+        """Add a new message, or stack it onto an identical last message."""
+        messages = self.messages
+        if messages and messages[-1].text == text:
+            messages[-1].count += 1
+            return
+        if len(messages) == messages.maxlen and self.spill_path is not None:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(f"{messages[0]}\n")
+        messages.append(Message(text))
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List
+import random
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
+import actions.ai
+import floors
+import messagelog
 import states.ingame
 import tqueue
 
@@ -10,25 +14,21 @@
     from gamemap import GameMap
 
 
-class Message:
-    def __init__(self, text: str) -> None:
-        self.text = text
-        self.count = 1
-
-    def __str__(self) -> str:
-        if self.count > 1:
-            return f"{self.text} (x{self.count})"
-        return self.text
-
-
 class Model:
     """The model contains everything from a session which should be saved."""
 
     active_map: GameMap
 
-    def __init__(self) -> None:
-        self.log: List[Message] = []
-        self.scheduler = tqueue.TurnQueue()
+    def __init__(
+        self, scheduler: Optional[tqueue.Scheduler] = None, seed: Optional[int] = None
+    ) -> None:
+        # All randomness of a session comes from `rng`, which is saved with it.
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.rng = random.Random(self.seed)
+        self.log = messagelog.MessageLog(spill_path=messagelog.get_spill_path())
+        self.report_count = 0  # Total number of messages reported.
+        self.scheduler = scheduler if scheduler is not None else tqueue.TurnQueue()
+        self.floors = floors.FloorStack(self)  # Floors other than active_map.
 
     @property
     def player(self) -> Actor:
@@ -36,19 +36,28 @@ def player(self) -> Actor:
 
     def report(self, text: str) -> None:
         print(text)
-        if self.log and self.log[-1].text == text:
-            self.log[-1].count += 1
-        else:
-            self.log.append(Message(text))
+        self.report_count += 1
+        self.log.add(text)
+
+    def __str__(self) -> str:
+        """A short summary of this session, shown by the main menu."""
+        floor = self.active_map.depth + 1
+        turn = self.scheduler.current_tick // 100
+        return f"Floor {floor}, Turn {turn}, HP {self.player.hp}/{self.player.max_hp}"
+
+    def get_metadata(self) -> Dict[str, Any]:
+        """Return the data stored in the header of this sessions save file."""
+        return {"summary": str(self), "tick": self.scheduler.current_tick}
 
     @property
     def is_player_dead(self) -> bool:
         """True if the player had died."""
-        return not self.player.fighter or self.player.fighter.hp <= 0
+        return self.player.hp <= 0
 
     def loop(self) -> None:
         while True:
             if self.is_player_dead:
                 states.ingame.GameOver(self).loop()
                 continue
-            self.scheduler.invoke_next()
+            if not actions.ai.take_monster_turns(self):
+                self.scheduler.invoke_next()
@@ -1,8 +1,7 @@
 """Dungeon level generator."""
 from __future__ import annotations
 
-import random
-from typing import TYPE_CHECKING, Iterator, List, Tuple, Type
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Type
 
 import numpy as np
 import tcod
@@ -30,6 +29,18 @@
     light=(ord(" "), (255, 255, 255), (200, 180, 50)),
     dark=(ord(" "), (255, 255, 255), (50, 50, 150)),
 )
+DOWN_STAIRS = gamemap.Tile(
+    move_cost=1,
+    transparent=True,
+    light=(ord(">"), (255, 255, 255), (200, 180, 50)),
+    dark=(ord(">"), (255, 255, 255), (50, 50, 150)),
+)
+UP_STAIRS = gamemap.Tile(
+    move_cost=1,
+    transparent=True,
+    light=(ord("<"), (255, 255, 255), (200, 180, 50)),
+    dark=(ord("<"), (255, 255, 255), (50, 50, 150)),
+)
 
 
 class Room:
@@ -79,27 +90,29 @@ def get_free_spaces(
         self, gamemap: gamemap.GameMap, number: int
     ) -> Iterator[Tuple[int, int]]:
         """Iterate over the x,y coordinates of up to `number` spaces."""
+        rng = gamemap.model.rng
         for _ in range(number):
-            x = random.randint(self.x1 + 1, self.x2 - 2)
-            y = random.randint(self.y1 + 1, self.y2 - 2)
+            x = rng.randint(self.x1 + 1, self.x2 - 2)
+            y = rng.randint(self.y1 + 1, self.y2 - 2)
             if gamemap.is_blocked(x, y):
                 continue
             yield x, y
 
     def place_entities(self, gamemap: gamemap.GameMap) -> None:
         """Spawn entities within this room."""
-        monsters = random.randint(0, 3)
-        items_spawned = random.randint(0, 2)
+        rng = gamemap.model.rng
+        monsters = rng.randint(0, 3)
+        items_spawned = rng.randint(0, 2)
         for xy in self.get_free_spaces(gamemap, monsters):
             monster_cls: Type[races.Fighter]
-            if random.randint(0, 100) < 80:
+            if rng.randint(0, 100) < 80:
                 monster_cls = races.common.Orc
             else:
                 monster_cls = races.common.Troll
             monster_cls.spawn(gamemap[xy])
 
         for xy in self.get_free_spaces(gamemap, items_spawned):
-            item_cls = random.choice(
+            item_cls = rng.choice(
                 [
                     items.other.FoodRation,
                     items.potions.HealingPotion,
@@ -112,52 +125,157 @@ def place_entities(self, gamemap: gamemap.GameMap) -> None:
             item_cls().place(gamemap[xy])
 
 
-def generate(model: Model, width: int = 80, height: int = 45) -> gamemap.GameMap:
-    """Return a randomly generated GameMap."""
+class RoomIndex:
+    """Finds the nearest of many rooms by bucketing their centers into cells.
+
+    Uses the same distance as `Room.distance_to`, ties go to the room which
+    was added first.
+    """
+
+    CELL_SIZE = 16
+
+    def __init__(self) -> None:
+        self.cells: Dict[Tuple[int, int], List[Tuple[int, Room]]] = {}
+        self.count = 0  # Number of rooms added, used to order ties.
+        self.bounds = (0, 0, -1, -1)  # Left, top, right, bottom occupied cells.
+
+    def add(self, room: Room) -> None:
+        x, y = room.center
+        cell_x, cell_y = x // self.CELL_SIZE, y // self.CELL_SIZE
+        self.cells.setdefault((cell_x, cell_y), []).append((self.count, room))
+        if self.count:
+            left, top, right, bottom = self.bounds
+            self.bounds = (
+                min(left, cell_x),
+                min(top, cell_y),
+                max(right, cell_x),
+                max(bottom, cell_y),
+            )
+        else:
+            self.bounds = cell_x, cell_y, cell_x, cell_y
+        self.count += 1
+
+    def nearest(self, room: Room) -> Room:
+        """Return the added room closest to `room`.
+
+        Cells are searched in rings around `room`, until the next ring can't
+        hold a closer room.
+        """
+        assert self.count, "No rooms have been added."
+        x, y = room.center
+        cell_x, cell_y = x // self.CELL_SIZE, y // self.CELL_SIZE
+        left, top, right, bottom = self.bounds
+        max_radius = max(
+            cell_x - left, right - cell_x, cell_y - top, bottom - cell_y, 0
+        )
+        best: Optional[Tuple[float, int, Room]] = None
+        for radius in range(max_radius + 1):
+            # Rooms in this ring are at least this far away.
+            if best is not None and (radius - 1) * self.CELL_SIZE >= best[0]:
+                break
+            for key in _ring(cell_x, cell_y, radius):
+                for index, other in self.cells.get(key, ()):
+                    candidate = room.distance_to(other), index, other
+                    if best is None or candidate[:2] < best[:2]:
+                        best = candidate
+        assert best is not None
+        return best[2]
+
+
+def _ring(x: int, y: int, radius: int) -> Iterator[Tuple[int, int]]:
+    """Iterate over the cells at exactly `radius` steps from x,y."""
+    if radius == 0:
+        yield x, y
+        return
+    for i in range(-radius, radius + 1):
+        yield x + i, y - radius
+        yield x + i, y + radius
+    for j in range(-radius + 1, radius):
+        yield x - radius, y + j
+        yield x + radius, y + j
+
+
+def generate(
+    model: Model, width: int = 80, height: int = 45, depth: int = 0
+) -> gamemap.GameMap:
+    """Return a randomly generated GameMap.
+
+    The player is spawned on the first floor, at a `depth` of 0.  On deeper
+    floors the player is placed by the caller, usually onto the up stairs.
+    """
     room_max_size = 10
     room_min_size = 6
-    max_rooms = 30
+    # 30 rooms are tried on an 80x45 map, larger maps try proportionally more.
+    max_rooms = max(30, 30 * width * height // (80 * 45))
 
-    gm = gamemap.GameMap(model, width, height)
-    gm.tiles[...] = WALL
+    rng = model.rng
+    gm = gamemap.GameMap(model, width, height, depth)
+    wall = gm.get_tile_id(WALL)
+    floor = gm.get_tile_id(FLOOR)
+    gm.tile_ids[...] = wall
+    # Tiles are carved into a plain x,y array, then copied to the map at once.
+    tiles = np.full((width, height), wall, dtype=gm.tile_ids.dtype)
     rooms: List[Room] = []
+    room_index = RoomIndex()
+    # True where a room is, including the tiles shared by touching rooms.
+    occupied = np.zeros((width + 1, height + 1), dtype=bool)
 
     for i in range(max_rooms):
         # random width and height
-        w = random.randint(room_min_size, room_max_size)
-        h = random.randint(room_min_size, room_max_size)
+        w = rng.randint(room_min_size, room_max_size)
+        h = rng.randint(room_min_size, room_max_size)
         # random position without going out of the boundaries of the map
-        x = random.randint(0, width - w)
-        y = random.randint(0, height - h)
+        x = rng.randint(0, width - w)
+        y = rng.randint(0, height - h)
         new_room = Room(x, y, w, h)
-        if any(new_room.intersects(other) for other in rooms):
+        # Same as checking `new_room.intersects` with every previous room.
+        if occupied[x : x + w + 1, y : y + h + 1].any():
             continue  # This room intersects with a previous room.
+        occupied[x : x + w + 1, y : y + h + 1] = True
 
         # Mark room inner area as open.
-        gm.tiles.T[new_room.inner] = FLOOR
+        tiles[new_room.inner] = floor
         if rooms:
             # Open a tunnel between rooms.
-            if random.randint(0, 99) < 80:
+            if rng.randint(0, 99) < 80:
                 # 80% of tunnels are to the nearest room.
-                other_room = min(rooms, key=new_room.distance_to)
+                other_room = room_index.nearest(new_room)
             else:
                 # 20% of tunnels are to the previous generated room.
                 other_room = rooms[-1]
             t_start = new_room.center
             t_end = other_room.center
-            if random.randint(0, 1):
+            if rng.randint(0, 1):
                 t_middle = t_start[0], t_end[1]
             else:
                 t_middle = t_end[0], t_start[1]
-            gm.tiles.T[tcod.line_where(*t_start, *t_middle)] = FLOOR
-            gm.tiles.T[tcod.line_where(*t_middle, *t_end)] = FLOOR
+            tiles[tcod.line_where(*t_start, *t_middle)] = floor
+            tiles[tcod.line_where(*t_middle, *t_end)] = floor
         rooms.append(new_room)
+        room_index.add(new_room)
+    gm.tile_ids.T[:, :] = tiles
 
-    # Add player to the first room.
-    gm.player = races.common.Player.spawn(gm[rooms[0].center], ai_cls=ai.PlayerControl)
+    # Stairs up are where the player arrives, stairs down are in the last room.
+    if depth > 0:
+        gm.stairs[rooms[0].center] = -1
+        gm.tile_ids.T[rooms[0].center] = gm.get_tile_id(UP_STAIRS)
+    down_xy = rooms[-1].center
+    if down_xy in gm.stairs:
+        # The only room has the up stairs, use the corner of its inner area.
+        down_xy = rooms[-1].x1 + 1, rooms[-1].y1 + 1
+    gm.stairs[down_xy] = 1
+    gm.tile_ids.T[down_xy] = gm.get_tile_id(DOWN_STAIRS)
+    gm.tiles_revision += 1
+
+    if depth == 0:
+        # Add player to the first room.
+        gm.player = races.common.Player.spawn(
+            gm[rooms[0].center], ai_cls=ai.PlayerControl
+        )
 
     for room in rooms:
         room.place_entities(gm)
 
-    gm.update_fov()
+    if depth == 0:
+        gm.update_fov()
     return gm
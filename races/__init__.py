@@ -15,6 +15,7 @@
 class Fighter(graphic.Graphic):
     render_order = 0
 
+    # Base stats, the current stats are held by the Actor using this fighter.
     hp: int = 0
     power: int = 0
     defense: int = 0
@@ -22,8 +23,6 @@ class Fighter(graphic.Graphic):
     DEFAULT_AI: Type[Action] = BasicMonster
 
     def __init__(self, inventory: Optional[Inventory] = None) -> None:
-        self.alive = True
-        self.max_hp = self.hp
         self.inventory = inventory or Inventory()
 
     @classmethod
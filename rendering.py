@@ -41,8 +41,8 @@ def draw_main_view(model: Model, console: Console) -> None:
         1,
         console.height - 2,
         bar_width,
-        f"HP: {player.fighter.hp:02}/{player.fighter.max_hp:02}",
-        player.fighter.hp / player.fighter.max_hp,
+        f"HP: {player.hp:02}/{player.max_hp:02}",
+        player.hp / player.max_hp,
         (0x40, 0x80, 0),
         (0x80, 0, 0),
     )
@@ -51,10 +51,11 @@ def draw_main_view(model: Model, console: Console) -> None:
     y = console.height
     log_width = console.width - x
     i = 0
-    for text in model.log[::-1]:
-        i += tcod.console.get_height_rect(log_width, str(text))
+    for message in reversed(model.log):
+        text, height = message.layout(log_width)
+        i += height
         if i >= 7:
             break
         console.print_box(
-            x, y - i, log_width, 0, str(text), fg=(255, 255, 255), bg=(0, 0, 0)
+            x, y - i, log_width, 0, text, fg=(255, 255, 255), bg=(0, 0, 0)
         )
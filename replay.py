@@ -0,0 +1,82 @@
+"""Recording and replaying the player commands of a session.
+
+Recording is off by default.  Set the RECORD environment variable to a file
+path and the keys of player commands in each game started with New Game are
+written there as a JSON trace once that game is left.  The keys along with the
+seed of the Model reproduce the whole session, a trace can be replayed without
+a window by `headless.py --replay`.
+
+Games loaded from a save file are not recorded, their earlier input is gone.
+"""
+from __future__ import annotations
+
+import json
+import os
+from collections import deque
+from typing import TYPE_CHECKING, Deque, List, NamedTuple, Optional, Tuple
+
+import tcod
+
+if TYPE_CHECKING:
+    from model import Model
+
+ENV_VAR = "RECORD"
+
+
+class ReplayEnd(Exception):
+    """Raised when a replay has run out of input."""
+
+
+class Trace(NamedTuple):
+    """Everything needed to replay a session."""
+
+    seed: int
+    width: int
+    height: int
+    keys: List[Tuple[int, int]]  # The (sym, mod) of each command key.
+
+    def add(self, event: tcod.event.KeyDown) -> None:
+        """Record a key which dispatched a player command."""
+        self.keys.append((int(event.sym), int(event.mod)))
+
+
+def get_path() -> Optional[str]:
+    """Return the path traces are recorded to, or None if not recording."""
+    return os.environ.get(ENV_VAR) or None
+
+
+def new_trace(model: Model) -> Trace:
+    """Return an empty trace for a newly generated session."""
+    return Trace(model.seed, model.active_map.width, model.active_map.height, [])
+
+
+def save_trace(trace: Trace, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace._asdict(), f)
+
+
+def load_trace(path: str) -> Trace:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return Trace(
+        data["seed"],
+        data["width"],
+        data["height"],
+        [(sym, mod) for sym, mod in data["keys"]],
+    )
+
+
+class Replay:
+    """Plays back recorded keys in place of real input, see `g.replay`."""
+
+    def __init__(self, keys: List[Tuple[int, int]]) -> None:
+        self.keys: Deque[Tuple[int, int]] = deque(keys)
+
+    def get_events(self) -> List[tcod.event.Event]:
+        """Return the next recorded key as an event, one at a time."""
+        if not self.keys:
+            raise ReplayEnd()
+        sym, mod = self.keys.popleft()
+        # Recent versions of tcod annotate these as enums, which are also ints.
+        event = tcod.event.KeyDown(scancode=0, sym=sym, mod=mod)  # type: ignore
+        return [event]
@@ -0,0 +1,212 @@
+"""Save file container which keeps large arrays out of the pickle stream.
+
+The object graph is pickled with protocol 5 and large buffers, such as the
+data of NumPy arrays, are stored out-of-band as separate blocks.  Blocks start
+on an aligned offset and can be stored uncompressed, which allows them to be
+memory-mapped when loading instead of being decompressed and copied.
+
+The file starts with a small uncompressed header holding JSON metadata, such
+as a summary of the save and a checksum.  The header can be read on its own
+without loading anything else.
+
+The checksum covers the body up to the end of the pickle stream, but not the
+array blocks after it, so that checking it does not read every page of a
+memory-mapped file.  Compressed blocks are checked by LZMA as they are
+decompressed, raw blocks are only checked to be within the file.
+
+Layout:
+    header: magic, format version, metadata size, metadata, padding.
+    body header: block count.
+    block table: offset, stored size, raw size and codec of each block.
+    blocks: the pickle stream followed by each out-of-band buffer.
+
+Block offsets are relative to the start of the body, which is aligned.
+"""
+from __future__ import annotations
+
+import json
+import lzma
+import mmap
+import os
+import pickle
+import pickletools
+import struct
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+MAGIC = b"RLTSAVE\x00"
+VERSION = 3
+ALIGNMENT = 64  # Block alignment in bytes.
+MIN_OUT_OF_BAND = 1024  # Smaller buffers are kept inside the pickle stream.
+
+CODEC_RAW = 0
+CODEC_LZMA = 1
+
+HEADER = struct.Struct("<8sII")  # magic, version, metadata_size
+BODY = struct.Struct("<I")  # block_count
+BLOCK = struct.Struct("<QQQB7x")  # offset, size, raw_size, codec
+
+
+class SaveFormatError(Exception):
+    """Raised when a file is not a save file of a supported version."""
+
+
+class Snapshot(NamedTuple):
+    """A pickled object along with copies of its out-of-band buffers."""
+
+    stream: bytes
+    buffers: List[bytes]
+    metadata: Dict[str, Any]  # JSON compatible data for the header.
+
+
+def snapshot(obj: Any, metadata: Optional[Dict[str, Any]] = None) -> Snapshot:
+    """Pickle `obj` and copy its buffers so that it can be changed afterwards.
+
+    `metadata` will be stored in the header, where it can be read quickly with
+    `read_header`.
+
+    This is the only part of saving that needs to happen before the game
+    continues, the rest can be done by `encode` in another thread.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        if buffer.raw().nbytes < MIN_OUT_OF_BAND:
+            return True  # Serialize in-band.
+        buffers.append(buffer)
+        return False
+
+    stream = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+    return Snapshot(
+        stream, [buffer.raw().tobytes() for buffer in buffers], metadata or {}
+    )
+
+
+def restore(snap: Snapshot) -> Any:
+    """Return a new copy of the object in a snapshot, without encoding it."""
+    return pickle.loads(snap.stream, buffers=[bytearray(b) for b in snap.buffers])
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def encode(snap: Snapshot, compress_arrays: bool = False) -> bytes:
+    """Return the save file data for a snapshot.
+
+    The pickle stream is always compressed.  Array buffers are only compressed
+    if `compress_arrays` is True, which makes for smaller files but prevents
+    them from being memory-mapped.
+    """
+    stream = pickletools.optimize(snap.stream)
+    # Each block is (data, raw_size, codec).
+    blocks: List[Tuple[bytes, int, int]] = [
+        (lzma.compress(stream), len(stream), CODEC_LZMA)
+    ]
+    for buffer in snap.buffers:
+        if compress_arrays:
+            blocks.append((lzma.compress(buffer), len(buffer), CODEC_LZMA))
+        else:
+            blocks.append((buffer, len(buffer), CODEC_RAW))
+
+    offset = _align(BODY.size + BLOCK.size * len(blocks))
+    table = []
+    for data, raw_size, codec in blocks:
+        table.append(BLOCK.pack(offset, len(data), raw_size, codec))
+        offset = _align(offset + len(data))
+
+    body = bytearray(BODY.pack(len(blocks)))
+    body += b"".join(table)
+    for data, _, _ in blocks:
+        body += bytes(_align(len(body)) - len(body))
+        body += data
+
+    checked_size = _align(BODY.size + BLOCK.size * len(blocks)) + len(blocks[0][0])
+    metadata = {**snap.metadata, "checksum": zlib.crc32(body[:checked_size])}
+    meta_data = json.dumps(metadata).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, len(meta_data)) + meta_data
+    header += bytes(_align(len(header)) - len(header))
+    return header + bytes(body)
+
+
+def _parse_header(data: Any) -> Tuple[Dict[str, Any], int]:
+    """Return the metadata and body offset from the start of a save file."""
+    if len(data) < HEADER.size:
+        raise SaveFormatError("File is too short to be a save file.")
+    magic, version, metadata_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SaveFormatError("Not a save file.")
+    if version != VERSION:
+        raise SaveFormatError(f"Unsupported save version {version}.")
+    meta_data = bytes(data[HEADER.size : HEADER.size + metadata_size])
+    if len(meta_data) != metadata_size:
+        raise SaveFormatError("Header is truncated.")
+    metadata: Dict[str, Any] = json.loads(meta_data.decode("utf-8"))
+    return metadata, _align(HEADER.size + metadata_size)
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Return the metadata of a save file without reading the rest of it."""
+    with open(path, "rb") as f:
+        data = f.read(HEADER.size)
+        if len(data) == HEADER.size:
+            data += f.read(HEADER.unpack(data)[2])
+    return _parse_header(data)[0]
+
+
+def decode(data: Any) -> Any:
+    """Return the object stored in save file data.
+
+    `data` can be a bytearray or a memory-mapped file, uncompressed blocks are
+    used without being copied.  Arrays restored from read-only data such as
+    bytes are read-only as well.
+    """
+    view = memoryview(data)
+    metadata, body_offset = _parse_header(view)
+    body = view[body_offset:]
+    try:
+        (block_count,) = BODY.unpack_from(body)
+        table = [
+            BLOCK.unpack_from(body, BODY.size + BLOCK.size * i)
+            for i in range(block_count)
+        ]
+    except struct.error:
+        raise SaveFormatError("Block table is truncated.") from None
+    if not table:
+        raise SaveFormatError("Save file has no pickle stream.")
+    # Only the body up to the end of the pickle stream is checksummed.
+    checked_size = table[0][0] + table[0][1]
+    checksum = zlib.crc32(body[:checked_size]) if checked_size <= len(body) else None
+    if checksum != metadata.get("checksum"):
+        raise SaveFormatError("Checksum mismatch, the save file is corrupt.")
+    blocks: List[Any] = []
+    for offset, size, raw_size, codec in table:
+        if offset + size > len(body):
+            raise SaveFormatError("Block is truncated.")
+        block = body[offset : offset + size]
+        if codec == CODEC_LZMA:
+            # A bytes buffer would make the restored arrays read-only.
+            blocks.append(bytearray(lzma.decompress(block)))
+        elif codec == CODEC_RAW:
+            blocks.append(block)
+        else:
+            raise SaveFormatError(f"Unknown codec {codec}.")
+        if len(blocks[-1]) != raw_size:
+            raise SaveFormatError("Block has the wrong size.")
+    return pickle.loads(blocks[0], buffers=blocks[1:])
+
+
+def load(path: str, use_mmap: bool = True) -> Any:
+    """Load an object from a save file.
+
+    With `use_mmap` the file is memory-mapped copy-on-write, so arrays can
+    be modified without changing the file.
+    """
+    with open(path, "rb") as f:
+        if not use_mmap:
+            data = bytearray(os.fstat(f.fileno()).st_size)
+            f.readinto(data)
+            return decode(data)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    # Arrays keep the mapping alive for as long as they need it.
+    return decode(mapped)
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
-from typing import Callable, Generic, Optional, TypeVar
+from typing import Callable, Generic, Iterable, Optional, TypeVar
 
 import tcod
 
 import g
+import instrument
 
 CONSOLE_MIN_SIZE = (32, 10)  # The smallest acceptable main console size.
 
 T = TypeVar("T")
 
+# Commands which don't affect the game, these are left out of recordings.
+UI_COMMANDS = {"toggle_timings"}
+
 
 class StateBreak(Exception):
     """Breaks out of the active State.loop and makes it return None."""
@@ -61,19 +65,30 @@ class State(Generic[T], tcod.event.EventDispatch[T]):
         tcod.event.K_d: "drop",
         tcod.event.K_i: "inventory",
         tcod.event.K_g: "pickup",
+        tcod.event.K_r: "rest",
         tcod.event.K_ESCAPE: "escape",
         tcod.event.K_RETURN: "confirm",
         tcod.event.K_KP_ENTER: "confirm",
+        tcod.event.K_F12: "toggle_timings",
     }
 
+    # Set when the screen needs to be drawn again, events which don't change
+    # anything visible leave this unset so that idle frames are skipped.
+    dirty = True
+
     def loop(self) -> Optional[T]:
         """Run a state based game loop."""
+        self.dirty = True
         while True:
-            self.on_draw(g.console)
-            g.context.present(g.console, keep_aspect=True, integer_scaling=True)
-            for event in tcod.event.wait():
-                if event.type == "WINDOWRESIZED":
+            if self.dirty and g.replay is None:
+                self.on_draw(g.console)
+                g.context.present(g.console, keep_aspect=True, integer_scaling=True)
+                self.dirty = False
+            for event in wait_for_events():
+                if isinstance(event, tcod.event.WindowResized):
                     g.console = configure_console()
+                if isinstance(event, tcod.event.WindowEvent):
+                    self.dirty = True  # Resized, exposed, etc.
                 try:
                     value = self.dispatch(event)
                 except StateBreak:
@@ -90,9 +105,15 @@ def ev_quit(self, event: tcod.event.Quit) -> Optional[T]:
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[T]:
         func: Callable[[], Optional[T]]
         if event.sym in self.COMMAND_KEYS:
-            func = getattr(self, f"cmd_{self.COMMAND_KEYS[event.sym]}")
+            self.dirty = True
+            command = self.COMMAND_KEYS[event.sym]
+            if command not in UI_COMMANDS:
+                record_command(event)
+            func = getattr(self, f"cmd_{command}")
             return func()
         elif event.sym in self.MOVE_KEYS:
+            self.dirty = True
+            record_command(event)
             return self.cmd_move(*self.MOVE_KEYS[event.sym])
         return None
 
@@ -118,6 +139,31 @@ def cmd_inventory(self) -> Optional[T]:
     def cmd_drop(self) -> Optional[T]:
         pass
 
+    def cmd_rest(self) -> Optional[T]:
+        pass
+
+    def cmd_toggle_timings(self) -> Optional[T]:
+        """Start or stop collecting timings, see the instrument module."""
+        if instrument.toggle():
+            print("Collecting timings.")
+        else:
+            path = instrument.path or instrument.DEFAULT_PATH
+            print(f"Stopped collecting timings, they will be written to {path}.")
+        return None
+
+
+def record_command(event: tcod.event.KeyDown) -> None:
+    """Add the key of a player command to the active recording, if any."""
+    if g.recording is not None:
+        g.recording.add(event)
+
+
+def wait_for_events() -> Iterable[tcod.event.Event]:
+    """Wait for input events, or take the next input of the active replay."""
+    if g.replay is not None:
+        return g.replay.get_events()
+    return tcod.event.wait()
+
 
 def configure_console() -> tcod.console.Console:
     """Return a new main console with an automatically determined size."""
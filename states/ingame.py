@@ -6,7 +6,7 @@
 
 import rendering
 from actions import common
-from states import GameOverQuit, SaveAndQuit, State, StateBreak
+from states import GameOverQuit, SaveAndQuit, State, StateBreak, record_command
 
 if TYPE_CHECKING:
     import actions
@@ -30,6 +30,17 @@ def cmd_escape(self) -> None:
         """Save and quit."""
         raise SaveAndQuit()
 
+    def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[actions.Action]:
+        if event.mod & tcod.event.KMOD_SHIFT:
+            if event.sym in (tcod.event.K_PERIOD, tcod.event.K_COMMA):
+                self.dirty = True
+                record_command(event)
+                return self.cmd_stairs()  # The '>' and '<' keys.
+        return super().ev_keydown(event)
+
+    def cmd_stairs(self) -> actions.Action:
+        return common.TakeStairs(self.model.player)
+
     def cmd_move(self, x: int, y: int) -> actions.Action:
         """Move the player entity."""
         return common.Move(self.model.player, (x, y))
@@ -37,6 +48,10 @@ def cmd_move(self, x: int, y: int) -> actions.Action:
     def cmd_pickup(self) -> actions.Action:
         return common.Pickup(self.model.player)
 
+    def cmd_rest(self) -> actions.Action:
+        """Rest until healed or disturbed."""
+        return common.Rest(self.model.player)
+
     def cmd_inventory(self) -> Optional[actions.Action]:
         state = UseInventory(self.model)
         return state.loop()
@@ -83,6 +98,7 @@ def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[actions.Action]:
         if char and char in inventory_.symbols:
             index = inventory_.symbols.index(char)
             if index < len(inventory_.contents):
+                record_command(event)
                 item = inventory_.contents[index]
                 return self.pick_item(item)
         return super().ev_keydown(event)
@@ -1,58 +1,204 @@
 from __future__ import annotations
 
-import lzma
+import concurrent.futures
+import multiprocessing
 import os.path
-import pickle
-import pickletools
+import random
 import sys
 import traceback
 from typing import Optional
 
 import tcod
 
+import g
+import instrument
 import procgen.dungeon
+import replay
+import savefile
 import states.ingame
 from model import Model
 
-SAVE_FILE_NAME = "save.sav.xz"
+SAVE_FILE_NAME = "save.sav"
+
+# A single worker so that saves are written one at a time, in order.
+save_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="save"
+)
+# Generates the next New Game while the main menu is open, see `get_generator`.
+generate_executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+
+def init_generator() -> None:
+    """Run by the generator worker as it starts.
+
+    The worker inherits the TIMINGS variable, its timings must not be written
+    over those of the game.
+    """
+    instrument.disable()
+    instrument.path = None
+    instrument.timings = instrument.Timings()
+
+
+def get_generator() -> concurrent.futures.ProcessPoolExecutor:
+    """Return the generator worker pool, starting it if needed.
+
+    The worker is spawned rather than forked, a fork would copy the SDL state
+    and threads of this process.
+    """
+    global generate_executor
+    if generate_executor is None:
+        generate_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_generator,
+        )
+    return generate_executor
+
+
+def stop_generator() -> None:
+    """Shut down the generator worker, it's started again when needed."""
+    global generate_executor
+    if generate_executor is not None:
+        generate_executor.shutdown(wait=False)
+        generate_executor = None
+
+
+def write_save(snapshot: savefile.Snapshot, path: str = SAVE_FILE_NAME) -> str:
+    """Encode and atomically write a Model snapshot to `path`.
+
+    This is slow and runs in the save worker thread.  Returns the message to
+    show the player, errors are raised.
+    """
+    try:
+        debug = f"Pickle: {len(snapshot.stream)} bytes, "
+        debug += f"Arrays: {sum(len(b) for b in snapshot.buffers)} bytes, "
+        data = savefile.encode(snapshot)
+        debug += f"File: {len(data)} bytes."
+        print(debug)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Never leave a partially written save.
+    except Exception:
+        traceback.print_exc(file=sys.stderr)
+        raise
+    return "Game saved."
+
+
+def generate_model(seed: int) -> savefile.Snapshot:
+    """Return a snapshot of a new game generated from `seed`.
+
+    This runs in the generator worker process.
+    """
+    model = Model(seed=seed)
+    model.active_map = procgen.dungeon.generate(model)
+    return savefile.snapshot(model)
 
 
 class MainMenu(states.State[None]):
     def __init__(self) -> None:
         super().__init__()
         self.model: Optional[Model] = None
+        self.pending_save: Optional[concurrent.futures.Future[str]] = None
+        self.saved_model: Optional[Model] = None  # The model of `pending_save`.
+        # The seed and snapshot of the next New Game, see `pregenerate`.
+        self.next_seed = 0
+        self.next_game: Optional[concurrent.futures.Future[savefile.Snapshot]] = None
+        # Player commands of the current game, if it's being recorded.
+        self.recording: Optional[replay.Trace] = None
+        self.has_save = False  # True if the save file can be continued from.
         self.continue_msg = "No save file."
+        if not os.path.exists(SAVE_FILE_NAME):
+            return
+        try:
+            # Only the header is read here, the save is loaded on Continue.
+            self.continue_msg = savefile.read_header(SAVE_FILE_NAME)["summary"]
+            self.has_save = True
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            self.continue_msg = "Error loading save."
+
+    def load(self) -> None:
+        """Load the model from the save file."""
         try:
-            with open(SAVE_FILE_NAME, "rb") as f:
-                self.model = pickle.loads(lzma.decompress(f.read()))
-            self.continue_msg = str(self.model)
+            # Windows can't replace a file which is memory-mapped.
+            self.model = savefile.load(SAVE_FILE_NAME, use_mmap=sys.platform != "win32")
+            self.recording = None  # The start of this game was not recorded.
+            self.stop_pregenerate()  # Not needed until this game is left.
         except Exception:
             traceback.print_exc(file=sys.stderr)
+            self.has_save = False
             self.continue_msg = "Error loading save."
 
     def on_draw(self, console: tcod.console.Console) -> None:
+        self.report_save()
         console.clear()
         console.print(5, 5, f"c: Continue ({self.continue_msg})")
         console.print(5, 6, "n: New Game")
         console.print(5, 7, "q: Quit")
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> None:
-        if event.sym == tcod.event.K_c and self.model:
-            self.start()
+        if event.sym == tcod.event.K_c and (self.model or self.has_save):
+            self.dirty = True
+            self.report_save()
+            if not self.model:
+                self.load()
+            if self.model:
+                self.start()
         elif event.sym == tcod.event.K_n:
+            self.dirty = True
             self.new_game()
         elif event.sym == tcod.event.K_q:
             self.cmd_quit()
         else:
             super().ev_keydown(event)
 
+    def loop(self) -> None:
+        self.pregenerate()
+        try:
+            super().loop()
+        finally:
+            self.stop_pregenerate()
+
+    def pregenerate(self) -> None:
+        """Start generating the next New Game in the generator worker."""
+        if self.next_game is not None:
+            return
+        self.next_seed = random.getrandbits(32)
+        try:
+            self.next_game = get_generator().submit(generate_model, self.next_seed)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)  # Generate on New Game instead.
+
+    def stop_pregenerate(self) -> None:
+        """Cancel the next New Game and shut down the generator worker."""
+        if self.next_game is not None:
+            self.next_game.cancel()
+            self.next_game = None
+        stop_generator()
+
     def new_game(self) -> None:
-        self.model = Model()
-        self.model.active_map = procgen.dungeon.generate(self.model)
+        """Start a new game, using the pregenerated one if it's ready."""
+        next_game, self.next_game = self.next_game, None
+        self.model = None
+        if next_game is not None and next_game.done():
+            try:
+                self.model = savefile.restore(next_game.result())
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+        if self.model is None:
+            if next_game is not None:
+                next_game.cancel()
+            # Generate the same game the worker would have.
+            seed = self.next_seed if next_game else random.getrandbits(32)
+            self.model = Model(seed=seed)
+            self.model.active_map = procgen.dungeon.generate(self.model)
+        self.recording = replay.new_trace(self.model) if replay.get_path() else None
         self.start()
 
     def start(self) -> None:
         assert self.model
+        g.recording = self.recording
         try:
             self.model.loop()
         except states.GameOverQuit:
@@ -65,29 +211,71 @@ def start(self) -> None:
             self.save()
         except SystemExit:
             # Save and exit immediately.
+            self.save_trace()
             if not self.model.is_player_dead:
                 self.save()
+                self.wait_for_save()
             else:
                 self.remove_save()
             raise
         except Exception:
             # Try to save on an error.
             self.save()
+            self.wait_for_save()
             raise
+        finally:
+            g.recording = None
+        self.save_trace()
         self.continue_msg = str(self.model)
+        self.pregenerate()
+
+    def save_trace(self) -> None:
+        """Write the recording of the current game, if there is one."""
+        path = replay.get_path()
+        if self.recording is None or path is None:
+            return
+        try:
+            replay.save_trace(self.recording, path)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)  # Never hide the game's errors.
 
     def save(self) -> None:
-        data = pickle.dumps(self.model, protocol=4)
-        debug = f"Raw: {len(data)} bytes, "
-        data = pickletools.optimize(data)
-        debug += f"Optimized: {len(data)} bytes, "
-        data = lzma.compress(data)
-        debug += f"Compressed: {len(data)} bytes."
-        print(debug)
-        print("Game saved.")
-        with open(SAVE_FILE_NAME, "wb") as f:
-            f.write(data)
+        """Save the current model in the background.
+
+        A snapshot of the model is taken right away so that later changes to
+        it are not saved, the rest is done by the save worker.
+        """
+        assert self.model
+        self.model.active_map.actor_store.compact()
+        snapshot = savefile.snapshot(self.model, self.model.get_metadata())
+        self.pending_save = save_executor.submit(write_save, snapshot)
+        self.saved_model = self.model
+
+    def report_save(self) -> None:
+        """Add the result of the last save to the log of its model, once done.
+
+        This is checked from the main thread, the save worker never touches
+        the model.
+        """
+        if self.pending_save is None or not self.pending_save.done():
+            return
+        pending_save, self.pending_save = self.pending_save, None
+        assert self.saved_model
+        try:
+            message = pending_save.result()
+        except Exception:
+            message = "The game could not be saved!"  # Printed by write_save.
+        self.saved_model.log.add(message)
+        self.saved_model = None
+
+    def wait_for_save(self) -> None:
+        """Block until the last save has been written, then report it."""
+        if self.pending_save:
+            concurrent.futures.wait([self.pending_save])
+            self.report_save()
 
     def remove_save(self) -> None:
+        self.wait_for_save()  # Don't let a pending save recreate the file.
+        self.has_save = False
         if os.path.exists(SAVE_FILE_NAME):
             os.remove(SAVE_FILE_NAME)  # Deletes the active save file.
@@ -0,0 +1,31 @@
+"""Tests for saving and loading a Model."""
+from __future__ import annotations
+
+import pathlib
+
+import pytest
+
+import headless
+import savefile
+
+
+@pytest.mark.parametrize(
+    "use_mmap, compress_arrays", [(True, False), (False, False), (True, True)]
+)
+def test_loaded_model_can_be_played(
+    tmp_path: pathlib.Path, use_mmap: bool, compress_arrays: bool
+) -> None:
+    model = headless.new_model(seed=3)
+    path = tmp_path / "save.sav"
+    snapshot = savefile.snapshot(model, model.get_metadata())
+    path.write_bytes(savefile.encode(snapshot, compress_arrays=compress_arrays))
+
+    loaded = savefile.load(str(path), use_mmap=use_mmap)
+    assert str(loaded) == str(model)
+    gm = loaded.active_map
+    assert gm.actor_store.data.flags.writeable
+    gm.tile_ids[0, 0] = gm.tile_ids[0, 0]
+    gm.explored[0, 0] = True
+    player_xy = loaded.player.location.xy
+    headless.simulate(loaded, 20)  # Moves actors and updates the field of view.
+    assert loaded.player.location.xy != player_xy
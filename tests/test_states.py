@@ -0,0 +1,63 @@
+"""Tests for the State game loop."""
+from __future__ import annotations
+
+from typing import Iterator, List, Tuple
+
+import pytest
+import tcod
+
+import g
+import states
+
+
+class Stop(Exception):
+    """Raised once the fake events have run out."""
+
+
+class FakeContext:
+    def present(self, console: tcod.console.Console, **kwargs: object) -> None:
+        pass
+
+    def recommended_console_size(self, min_columns: int, min_rows: int) -> Tuple[int, int]:
+        return 40, 20
+
+
+class CountDraws(states.State[None]):
+    def __init__(self) -> None:
+        self.draws = 0
+
+    def on_draw(self, console: tcod.console.Console) -> None:
+        self.draws += 1
+
+
+def run_events(
+    monkeypatch: pytest.MonkeyPatch, events: List[tcod.event.Event]
+) -> CountDraws:
+    """Run a CountDraws state over `events` and return it."""
+    batches: Iterator[List[tcod.event.Event]] = iter([[event] for event in events])
+
+    def wait_for_events() -> List[tcod.event.Event]:
+        for batch in batches:
+            return batch
+        raise Stop()
+
+    monkeypatch.setattr(g, "context", FakeContext(), raising=False)
+    monkeypatch.setattr(g, "console", tcod.console.Console(32, 10), raising=False)
+    monkeypatch.setattr(states, "wait_for_events", wait_for_events)
+    state = CountDraws()
+    with pytest.raises(Stop):
+        state.loop()
+    return state
+
+
+def test_window_event_redraws(monkeypatch: pytest.MonkeyPatch) -> None:
+    event = tcod.event.WindowEvent(type="WindowExposed", window_id=0, data=(0, 0))
+    state = run_events(monkeypatch, [event, event])
+    assert state.draws == 3  # The first frame, then once after each event.
+
+
+def test_window_resize_reconfigures_console(monkeypatch: pytest.MonkeyPatch) -> None:
+    event = tcod.event.WindowResized(type="WindowResized", window_id=0, data=(0, 0))
+    state = run_events(monkeypatch, [event])
+    assert state.draws == 2
+    assert (g.console.width, g.console.height) == (40, 20)
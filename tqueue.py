@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import heapq
-from typing import Callable, List, NamedTuple, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Type
 
 
 class Ticket(NamedTuple):
@@ -9,18 +10,48 @@ class Ticket(NamedTuple):
 
     tick: int
     unique_id: int
-    func: Callable[[TurnQueue, Ticket], None]  # type: ignore
+    func: Callable[[Scheduler, Ticket], None]  # type: ignore
     # https://github.com/python/mypy/issues/731
 
 
-class TurnQueue:
+class Scheduler:
+    """The interface shared by the turn queue backends.
+
+    Tickets are called in order of their tick, tickets with the same tick are
+    called in the order they were scheduled.
+    """
+
     def __init__(self) -> None:
         self.current_tick = 0
         self.last_unique_id = 0  # Used to sort same-tick ticks in FIFO order.
-        self.heap: List[Ticket] = []
+
+    def _new_ticket(
+        self, interval: int, func: Callable[[Scheduler, Ticket], None]
+    ) -> Ticket:
+        assert interval >= 0, "Tickets can not be scheduled in the past."
+        ticket = Ticket(self.current_tick + interval, self.last_unique_id, func)
+        self.last_unique_id += 1
+        return ticket
+
+    def __len__(self) -> int:
+        """The number of scheduled tickets, not counting stale ones."""
+        raise NotImplementedError()
+
+    @property
+    def stale(self) -> int:
+        """The number of cancelled tickets which are still held by the queue."""
+        raise NotImplementedError()
+
+    def peek(self) -> Ticket:
+        """Return the Ticket which will be called next."""
+        raise NotImplementedError()
+
+    def due(self) -> List[Ticket]:
+        """Return every Ticket on the same tick as the next one, in call order."""
+        raise NotImplementedError()
 
     def schedule(
-        self, interval: int, func: Callable[[TurnQueue, Ticket], None]
+        self, interval: int, func: Callable[[Scheduler, Ticket], None]
     ) -> Ticket:
         """Add a callable object to the turn queue.
 
@@ -30,16 +61,13 @@ def schedule(
 
         Returns the newly scheduled Ticket instance.
         """
-        ticket = Ticket(self.current_tick + interval, self.last_unique_id, func)
-        heapq.heappush(self.heap, ticket)
-        self.last_unique_id += 1
-        return ticket
+        raise NotImplementedError()
 
     def reschedule(
         self,
         ticket: Ticket,
         interval: int,
-        func: Optional[Callable[[TurnQueue, Ticket], None]] = None,
+        func: Optional[Callable[[Scheduler, Ticket], None]] = None,
     ) -> Ticket:
         """Reschedule a new Ticket in place of the existing one.
 
@@ -53,15 +81,9 @@ def reschedule(
         Returns the newly scheduled Ticket instance.
         """
         assert ticket is not None
-        assert self.heap[0] is ticket
-        ticket = Ticket(
-            self.current_tick + interval,
-            self.last_unique_id,
-            ticket.func if func is None else func,
-        )
-        heapq.heappushpop(self.heap, ticket)
-        self.last_unique_id += 1
-        return ticket
+        assert self.peek() is ticket
+        self.unschedule(ticket)
+        return self.schedule(interval, ticket.func if func is None else func)
 
     def unschedule(self, ticket: Ticket) -> None:
         """Explicitly remove the current ticket.
@@ -69,8 +91,17 @@ def unschedule(self, ticket: Ticket) -> None:
         `ticket` must be the currently active Ticket.
         """
         assert ticket is not None
-        assert self.heap[0] is ticket
-        heapq.heappop(self.heap)
+        assert self.peek() is ticket
+        self.cancel(ticket)
+
+    def cancel(self, ticket: Ticket) -> None:
+        """Remove any scheduled ticket, it will not be called."""
+        raise NotImplementedError()
+
+    def remove(self, tickets: Iterable[Ticket]) -> None:
+        """Remove any number of scheduled tickets."""
+        for ticket in tickets:
+            self.cancel(ticket)
 
     def invoke_next(self) -> None:
         """Call the next scheduled function.
@@ -78,7 +109,216 @@ def invoke_next(self) -> None:
         This expects the scheduled function to take care of removing or
         rescheduling its own Ticket object.  It will fail otherwise.
         """
-        ticket = self.heap[0]
+        ticket = self.peek()
         self.current_tick = ticket.tick
         ticket.func(self, ticket)
-        assert ticket is not self.heap[0], f"{ticket!r} was not rescheduled."
+        assert (
+            not len(self) or ticket is not self.peek()
+        ), f"{ticket!r} was not rescheduled."
+
+
+class TurnQueue(Scheduler):
+    """A turn queue backed by a binary heap.
+
+    Cancelled tickets are left in the heap and are discarded once they reach
+    the top of it.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.heap: List[Ticket] = []
+        self.cancelled: Set[int] = set()  # unique_id of stale tickets in heap.
+
+    def __len__(self) -> int:
+        return len(self.heap) - len(self.cancelled)
+
+    @property
+    def stale(self) -> int:
+        return len(self.cancelled)
+
+    def _discard_stale(self) -> None:
+        """Pop cancelled tickets from the top of the heap."""
+        while self.heap and self.heap[0].unique_id in self.cancelled:
+            self.cancelled.remove(heapq.heappop(self.heap).unique_id)
+
+    def peek(self) -> Ticket:
+        return self.heap[0]
+
+    def due(self) -> List[Ticket]:
+        tick = self.heap[0].tick
+        return sorted(
+            ticket
+            for ticket in self.heap
+            if ticket.tick == tick and ticket.unique_id not in self.cancelled
+        )
+
+    def schedule(
+        self, interval: int, func: Callable[[Scheduler, Ticket], None]
+    ) -> Ticket:
+        ticket = self._new_ticket(interval, func)
+        heapq.heappush(self.heap, ticket)
+        return ticket
+
+    def reschedule(
+        self,
+        ticket: Ticket,
+        interval: int,
+        func: Optional[Callable[[Scheduler, Ticket], None]] = None,
+    ) -> Ticket:
+        assert ticket is not None
+        assert self.heap[0] is ticket
+        ticket = self._new_ticket(interval, ticket.func if func is None else func)
+        heapq.heappushpop(self.heap, ticket)
+        self._discard_stale()
+        return ticket
+
+    def cancel(self, ticket: Ticket) -> None:
+        if self.heap[0] is ticket:
+            heapq.heappop(self.heap)
+            self._discard_stale()
+        else:
+            self.cancelled.add(ticket.unique_id)
+
+    def remove(self, tickets: Iterable[Ticket]) -> None:
+        """Remove any number of scheduled tickets.
+
+        This rebuilds the heap, which is faster than `cancel` for many tickets.
+        """
+        removed = {ticket.unique_id for ticket in tickets} | self.cancelled
+        self.heap = [t for t in self.heap if t.unique_id not in removed]
+        heapq.heapify(self.heap)
+        self.cancelled.clear()
+
+
+class TimingWheel(Scheduler):
+    """A turn queue which sorts tickets into a ring of buckets, one per tick.
+
+    The wheel covers the `WHEEL_SIZE` ticks starting from `current_tick`, which
+    is longer than the usual turn.  Each bucket is ordered by `unique_id`, so
+    tickets can be added, called, and cancelled in constant time.  Tickets
+    beyond the wheel wait in an overflow heap until the wheel reaches them,
+    cancelled overflow tickets are left there until then.
+    """
+
+    WHEEL_SIZE = 256  # Must be a power of two.
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.buckets: List[OrderedDict[int, Ticket]] = [
+            OrderedDict() for _ in range(self.WHEEL_SIZE)
+        ]
+        self.occupied = 0  # A bit for each non-empty bucket.
+        self.overflow: List[Ticket] = []  # Tickets past the end of the wheel.
+        self.cancelled: Set[int] = set()  # unique_id of stale overflow tickets.
+
+    def __len__(self) -> int:
+        in_wheel = sum(len(bucket) for bucket in self.buckets)
+        return in_wheel + len(self.overflow) - len(self.cancelled)
+
+    @property
+    def stale(self) -> int:
+        return len(self.cancelled)
+
+    def _add(self, ticket: Ticket) -> None:
+        """Put a ticket into its bucket, or into the overflow heap."""
+        if ticket.tick - self.current_tick >= self.WHEEL_SIZE:
+            heapq.heappush(self.overflow, ticket)
+            return
+        index = ticket.tick & (self.WHEEL_SIZE - 1)
+        self.buckets[index][ticket.unique_id] = ticket
+        self.occupied |= 1 << index
+
+    def _next_bucket(self) -> int:
+        """Return the index of the next non-empty bucket, or -1 if none are."""
+        occupied = self.occupied
+        if not occupied:
+            return -1
+        size = self.WHEEL_SIZE
+        start = self.current_tick & (size - 1)
+        # Rotate the bits so that the current bucket is the lowest one.
+        rotated = ((occupied >> start) | (occupied << (size - start))) & (
+            (1 << size) - 1
+        )
+        return (start + (rotated & -rotated).bit_length() - 1) & (size - 1)
+
+    def _advance(self, tick: int) -> None:
+        """Move the wheel to `tick`, taking in overflow tickets which now fit."""
+        self.current_tick = tick
+        overflow = self.overflow
+        while overflow and overflow[0].tick - tick < self.WHEEL_SIZE:
+            ticket = heapq.heappop(overflow)
+            if ticket.unique_id in self.cancelled:
+                self.cancelled.remove(ticket.unique_id)
+            else:
+                self._add(ticket)
+
+    def peek(self) -> Ticket:
+        bucket = self.buckets[self.current_tick & (self.WHEEL_SIZE - 1)]
+        if bucket:
+            return next(iter(bucket.values()))  # More tickets for this tick.
+        index = self._next_bucket()
+        if index != -1:
+            return next(iter(self.buckets[index].values()))
+        overflow = self.overflow
+        while overflow[0].unique_id in self.cancelled:
+            self.cancelled.remove(heapq.heappop(overflow).unique_id)
+        return overflow[0]
+
+    def due(self) -> List[Ticket]:
+        tick = self.peek().tick
+        if tick - self.current_tick < self.WHEEL_SIZE:
+            return list(self.buckets[tick & (self.WHEEL_SIZE - 1)].values())
+        return sorted(
+            ticket
+            for ticket in self.overflow
+            if ticket.tick == tick and ticket.unique_id not in self.cancelled
+        )
+
+    def schedule(
+        self, interval: int, func: Callable[[Scheduler, Ticket], None]
+    ) -> Ticket:
+        ticket = self._new_ticket(interval, func)
+        self._add(ticket)
+        return ticket
+
+    def reschedule(
+        self,
+        ticket: Ticket,
+        interval: int,
+        func: Optional[Callable[[Scheduler, Ticket], None]] = None,
+    ) -> Ticket:
+        """Reschedule a new Ticket in place of the existing one.
+
+        Unlike TurnQueue, `ticket` may be any scheduled Ticket.
+        """
+        self.cancel(ticket)
+        ticket = self._new_ticket(interval, ticket.func if func is None else func)
+        self._add(ticket)
+        return ticket
+
+    def unschedule(self, ticket: Ticket) -> None:
+        """Remove a ticket, this is the same as `cancel`."""
+        self.cancel(ticket)
+
+    def cancel(self, ticket: Ticket) -> None:
+        if ticket.tick - self.current_tick >= self.WHEEL_SIZE:
+            self.cancelled.add(ticket.unique_id)
+            return
+        index = ticket.tick & (self.WHEEL_SIZE - 1)
+        bucket = self.buckets[index]
+        del bucket[ticket.unique_id]
+        if not bucket:
+            self.occupied &= ~(1 << index)
+
+    def invoke_next(self) -> None:
+        ticket = self.peek()
+        if ticket.tick != self.current_tick:
+            self._advance(ticket.tick)
+        ticket.func(self, ticket)
+        assert (
+            ticket.unique_id not in self.buckets[ticket.tick & (self.WHEEL_SIZE - 1)]
+        ), f"{ticket!r} was not rescheduled."
+
+
+# Scheduler backends by name, for command line options.
+SCHEDULERS: Dict[str, Type[Scheduler]] = {"heap": TurnQueue, "wheel": TimingWheel}